@@ -1,30 +1,117 @@
 import torch
-import random
+import numpy as np
 from collections import deque
-from model import QNet, QTrainer
+from model import QNet, ConvQNet, QTrainer, TrainStats
+from replay_memory import PackedReplayMemory
+from dataset import load_dataset
+from demonstrations import iter_demonstrations
+from seeding import spawn_seeds, int_seed
 
 
 MAX_MEMORY = 100000
 BATCH_SIZE = 1000
+PRETRAIN_BATCH_SIZE = 4096
 LR = 0.001
 
 
+GRID_CHANNELS = 4
+STATE_SIZE = 19
+REACHABILITY_SIZE = 3
+
+
 class Agent:
-    def __init__(self):
+    def __init__(self, observation="features", board_size=10,
+                 reachability=False, action_mask=False, train_every=0,
+                 gradient_steps=1, batch_size=BATCH_SIZE, n_step=1,
+                 target_update=0, tau=0.0, double_dqn=False,
+                 stats_every=10, seed=None, compile_step=False):
         """
         Initializes the reinforcement learning agent.
 
+        Args:
+            observation (str): "features" for the 19-feature vector of
+                Snake.get_state, "grid" for the board planes of
+                Snake.get_grid
+            board_size (int): Size of the board, used by grid observations
+            reachability (bool): Whether feature vectors carry the 3
+                reachable area features of Snake(reachability=True)
+            action_mask (bool): Whether the max over next actions in the
+                Q-learning target skips immediately fatal actions
+            train_every (int): Run gradient_steps replay updates every
+                this many environment steps; 0 keeps the default of one
+                update per step plus a replay update after every game
+            gradient_steps (int): Replay updates per scheduled training
+            batch_size (int): Transitions sampled per replay update
+            n_step (int): Number of rewards summed in each stored
+                transition before bootstrapping from the Q-network
+            target_update (int): Refresh a frozen target network every
+                this many updates (0 bootstraps from the model itself)
+            tau (float): Polyak rate of a soft-updated target network
+            double_dqn (bool): Use Double DQN targets (needs target_update
+                or tau)
+            stats_every (int): Sample training statistics every this many
+                updates, see QTrainer
+            seed: int or numpy SeedSequence; the network initialisation,
+                the exploration and the replay sampling each get their
+                own stream spawned from it. None draws fresh entropy and
+                initialises the network from the global torch generator
+            compile_step (bool): Compile the training step for single
+                transitions and batch_size batches, see QTrainer
+
         Sets up the Q-network, memory buffer, and training parameters
-        for the Deep Q-Learning algorithm.
+        for the Deep Q-Learning algorithm. Grid observations use the
+        convolutional network and a bit-packed replay memory.
+
+        Every n-step transition that does not end the game bootstraps
+        exactly n steps ahead, so the trainer discounts the bootstrap
+        with gamma ** n_step; shorter windows only occur when the game
+        ends and have no bootstrap term.
         """
         self.n_games = 0
         self.epsilon = 0
         self.gamma = 0.9
-        self.memory = deque(maxlen=MAX_MEMORY)
-        self.model = QNet(19, 512, 3)
-        self.trainer = QTrainer(self.model, lr=LR, gamma=self.gamma)
+        self.observation = observation
+        self.action_mask = action_mask
+        self.train_every = train_every
+        self.gradient_steps = gradient_steps
+        self.batch_size = batch_size
+        self.n_step = n_step
+        self.n_step_window = deque(maxlen=n_step)
+        self.steps = 0
+        self.learner = None
+        self.last_train_stats = None
+        self._stats_sum = np.zeros(len(TrainStats._fields))
+        self._stats_count = 0
+        model_seed, memory_seed, action_seed = spawn_seeds(seed, 3)
+        # Exploration and replay sampling use separate generators so a
+        # background learner drawing batches does not shift the actions.
+        self.rng = np.random.default_rng(action_seed)
+        self.memory_rng = np.random.default_rng(memory_seed)
+        if observation == "grid":
+            self.memory = PackedReplayMemory(
+                MAX_MEMORY, (GRID_CHANNELS, board_size, board_size),
+                rng=self.memory_rng)
+        else:
+            self.memory = deque(maxlen=MAX_MEMORY)
+        with torch.random.fork_rng(devices=[], enabled=seed is not None):
+            if seed is not None:
+                torch.manual_seed(int_seed(model_seed))
+            if observation == "grid":
+                self.model = ConvQNet(GRID_CHANNELS, 3)
+            else:
+                input_size = STATE_SIZE
+                if reachability:
+                    input_size += REACHABILITY_SIZE
+                self.model = QNet(input_size, 512, 3)
+        self.trainer = QTrainer(self.model, lr=LR,
+                                gamma=self.gamma ** n_step,
+                                target_update=target_update, tau=tau,
+                                double=double_dqn, stats_every=stats_every,
+                                compile_step=compile_step,
+                                compile_sizes=(1, batch_size))
 
-    def remember(self, state, action, reward, next_state, done):
+    def remember(self, state, action, reward, next_state, done,
+                 next_mask=None):
         """
         Stores an experience tuple in the replay memory buffer.
 
@@ -34,31 +121,202 @@ class Agent:
             reward: Reward received after the action
             next_state: State reached after the action
             done: Boolean indicating if the episode ended
+            next_mask: Non-fatal actions in next_state (Snake.action_mask),
+                only kept for grid observations; feature vectors already
+                carry them as danger bits
 
         Uses a deque with maximum capacity
         to automatically remove old experiences
         when the buffer is full.
         """
-        self.memory.append((state, action, reward, next_state, done))
+        transition = (state, action, reward, next_state, done)
+        if isinstance(self.memory, PackedReplayMemory):
+            self.memory.append(transition, next_mask)
+        else:
+            self.memory.append(transition)
+
+    def _next_masks(self, next_states, next_masks=None):
+        """
+        Masks for the target max, or None when masking is disabled.
+        Feature vectors start with the danger straight/right/left bits.
+        """
+        if not self.action_mask:
+            return None
+        if next_masks is not None or self.observation == "grid":
+            return next_masks
+        return np.asarray(next_states)[..., :3] == 0
+
+    def _n_step_transitions(self, state, action, reward, next_state, done,
+                            next_mask):
+        """
+        Pushes a step into the rolling window and returns the n-step
+        transitions it completes: the oldest one once the window is
+        full, or all of them when the game ends.
+        """
+        window = self.n_step_window
+        window.append((state, action, reward))
+        if len(window) < self.n_step and not done:
+            return []
+        transitions = []
+        while window:
+            ret = 0
+            for i, (_, _, r) in enumerate(window):
+                ret += self.gamma ** i * r
+            first_state, first_action, _ = window.popleft()
+            transitions.append((first_state, first_action, ret, next_state,
+                                done, next_mask))
+            if not done:
+                break
+        return transitions
+
+    def step(self, state, action, reward, next_state, done, next_mask=None):
+        """
+        Learns from one environment step.
+
+        Args:
+            state: State before the action
+            action: One-hot action taken
+            reward: Reward received
+            next_state: State after the action
+            done: Boolean indicating if the episode ended
+            next_mask: Non-fatal actions in next_state, see remember
+
+        Returns:
+            int: Number of gradient updates run
+
+        The step goes through the n-step window into the replay memory.
+        Without a schedule every completed transition is trained on at
+        once; with train_every set, gradient_steps batches of batch_size
+        are replayed every train_every steps instead. With a
+        BackgroundLearner attached the step is only stored, under the
+        learner's lock, and training happens on the learner thread.
+        """
+        transitions = self._n_step_transitions(
+            state, action, reward, next_state, done, next_mask)
+        if self.learner is not None:
+            with self.learner.lock:
+                for transition in transitions:
+                    self.remember(*transition)
+            self.steps += 1
+            return 0
+        updates = 0
+        for transition in transitions:
+            if not self.train_every:
+                self.train_short_memory(*transition)
+                updates += 1
+            self.remember(*transition)
+        self.steps += 1
+        if self.train_every and self.steps % self.train_every == 0 and \
+                len(self.memory):
+            for _ in range(self.gradient_steps):
+                self.train_long_memory()
+            updates += self.gradient_steps
+        return updates
+
+    def sample_batch(self, batch_size=None):
+        """
+        Draws a replay batch.
+
+        Args:
+            batch_size (int): Number of transitions to sample, the
+                agent's batch_size by default
+
+        Returns:
+            tuple: Arguments for QTrainer.train_step (states, actions,
+            rewards, next states, dones and next masks)
+        """
+        batch_size = batch_size or self.batch_size
+        next_masks = None
+        if isinstance(self.memory, PackedReplayMemory):
+            states, actions, rewards, next_states, dones, next_masks = \
+                self.memory.sample(batch_size)
+        else:
+            if len(self.memory) > batch_size:
+                idx = self.memory_rng.choice(len(self.memory), batch_size,
+                                             replace=False)
+                mini_sample = [self.memory[i] for i in idx]
+            else:
+                mini_sample = self.memory
+            states, actions, rewards, next_states, dones = zip(*mini_sample)
+        return (states, actions, rewards, next_states, dones,
+                self._next_masks(next_states, next_masks))
 
-    def train_long_memory(self):
+    def train_long_memory(self, batch_size=None):
         """
         Trains the Q-network using a batch of
         experiences from memory (experience replay).
 
+        Args:
+            batch_size (int): Number of transitions to sample, the
+                agent's batch_size by default
+
         Samples a random batch from memory if enough experiences are available,
         otherwise uses all stored experiences. This helps break correlations
         between consecutive experiences and improves training stability.
+
+        Returns:
+            TrainStats: Statistics of the update, or None when it was not
+            sampled
         """
-        if len(self.memory) > BATCH_SIZE:
-            mini_sample = random.sample(self.memory, BATCH_SIZE)
-        else:
-            mini_sample = self.memory
+        return self.train_batch(self.sample_batch(batch_size))
 
-        states, actions, rewards, next_states, dones = zip(*mini_sample)
-        self.trainer.train_step(states, actions, rewards, next_states, dones)
+    def train_batch(self, batch):
+        """
+        Runs one update on a batch returned by sample_batch.
+        """
+        return self._track_stats(self.trainer.train_step(*batch))
 
-    def train_short_memory(self, state, action, reward, next_state, done):
+    def pretrain(self, path, epochs=1, batch_size=PRETRAIN_BATCH_SIZE):
+        """
+        Fits the Q-network on an offline dataset before online training.
+
+        Args:
+            path (str): Dataset written by dataset.generate_dataset
+            epochs (int): Number of passes over the dataset
+            batch_size (int): Number of transitions per update
+
+        The most recent transitions are also copied into the replay
+        memory so the first long memory updates are not limited to
+        the handful of experiences collected by the first games. With
+        action masking the targets are masked as in online training.
+        """
+        states, actions, rewards, next_states, dones = load_dataset(path)
+        size = len(actions)
+        for _ in range(epochs):
+            order = self.rng.permutation(size)
+            for start in range(0, size, batch_size):
+                idx = order[start:start + batch_size]
+                self.trainer.train_step(
+                    states[idx], actions[idx], rewards[idx],
+                    next_states[idx], dones[idx].tolist(),
+                    self._next_masks(next_states[idx]))
+
+        for i in range(max(0, size - MAX_MEMORY), size):
+            self.remember(states[i], actions[i].tolist(), rewards[i],
+                          next_states[i], bool(dones[i]))
+
+    def load_demonstrations(self, paths):
+        """
+        Streams recorded human play into the replay memory.
+
+        Args:
+            paths (list): Demonstration files written by DemoRecorder
+
+        Returns:
+            int: Number of expert transitions added
+
+        Files are decoded chunk by chunk, so arbitrarily long recordings
+        can be loaded; only the newest MAX_MEMORY transitions are kept.
+        """
+        count = 0
+        for path in paths:
+            for transition in iter_demonstrations(path):
+                self.remember(*transition)
+                count += 1
+        return count
+
+    def train_short_memory(self, state, action, reward, next_state, done,
+                           next_mask=None):
         """
         Trains the Q-network immediately with the current experience.
 
@@ -68,19 +326,57 @@ class Agent:
             reward: Reward received after the action
             next_state: State reached after the action
             done: Boolean indicating if the episode ended
+            next_mask: Non-fatal actions in next_state, see remember
 
         This immediate training helps the agent learn from recent experiences.
+
+        Returns:
+            TrainStats: Statistics of the update, or None when it was not
+            sampled
+        """
+        return self._track_stats(self.trainer.train_step(
+            state, action, reward, next_state, done,
+            self._next_masks(next_state, next_mask)))
+
+    def _track_stats(self, stats):
+        if stats is not None:
+            self.last_train_stats = stats
+            self._stats_sum += stats
+            self._stats_count += 1
+        return stats
+
+    @property
+    def last_loss(self):
+        stats = self.last_train_stats
+        return stats.loss if stats else None
+
+    def take_train_stats(self):
+        """
+        Returns the mean TrainStats of the sampled updates since the
+        previous call (None if there was none) and starts a new average.
         """
-        self.trainer.train_step(state, action, reward, next_state, done)
+        if not self._stats_count:
+            return None
+        mean = TrainStats(*(self._stats_sum / self._stats_count).tolist())
+        self._stats_sum[:] = 0
+        self._stats_count = 0
+        return mean
 
-    def get_action(self, state, sessions, dontlearn=False):
+    def get_action(self, state, sessions, dontlearn=False, mask=None,
+                   progress=None):
         """
         Selects an action using epsilon-greedy strategy.
 
         Args:
             state: Current state representation
-            sessions: Total number of training sessions planned
+            sessions: Total number of training sessions planned, used
+                when progress is not given
             dontlearn: If True, disables exploration (pure exploitation)
+            mask: Optional boolean [straight, right, left] array of the
+                non-fatal actions (Snake.action_mask); random and greedy
+                choices are restricted to them when there is at least one
+            progress: Share (0 to 1) of the exploration schedule already
+                elapsed, e.g. counted in steps or seconds
 
         Returns:
             list: One-hot encoded action [straight, right, left]
@@ -94,15 +390,30 @@ class Agent:
         """
         if dontlearn:
             self.epsilon = 0
+        elif progress is not None:
+            self.epsilon = max(0, 80 * (1 - progress))
         else:
             self.epsilon = max(0, (80 * (sessions - self.n_games)) / sessions)
+        if mask is not None and not any(mask):
+            mask = None
         final_move = [0, 0, 0]
-        if random.randint(0, 200) < self.epsilon:
-            move = random.randint(0, 2)
+        # Greedy play (evaluations, -dontlearn) draws no random numbers,
+        # so it leaves the exploration stream of a seeded run untouched.
+        if not dontlearn and self.rng.integers(0, 201) < self.epsilon:
+            if mask is None:
+                move = int(self.rng.integers(0, 3))
+            else:
+                move = int(self.rng.choice(np.flatnonzero(mask)))
             final_move[move] = 1
         else:
             state0 = torch.tensor(state, dtype=torch.float)
-            prediction = self.model(state0)
+            if self.learner is not None:
+                prediction = self.learner.predict(state0)
+            else:
+                prediction = self.model(state0)
+            if mask is not None:
+                prediction = prediction.masked_fill(
+                    ~torch.tensor(mask, dtype=torch.bool), float("-inf"))
             move = torch.argmax(prediction).item()
             final_move[move] = 1
         return final_move
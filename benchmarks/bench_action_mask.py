@@ -0,0 +1,40 @@
+"""
+Trains with and without action masking and compares the runs.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_action_mask -games 100
+"""
+import argparse
+from agent import Agent
+from benchmarks.common import seed_torch, train_headless
+
+
+def run(masked, games, board_size, target_score, seed=0):
+    seed_torch(seed)
+    agent = Agent(board_size=board_size, action_mask=masked, seed=seed)
+    return train_headless(agent, board_size, games, masked, target_score,
+                          seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-games", type=int, default=100)
+    parser.add_argument("-board-size", type=int, default=10)
+    parser.add_argument("-target-score", type=int, default=10)
+    parser.add_argument("-seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'mask':>5} {'steps':>7} {'steps/s':>8} {'length':>7} "
+          f"{'score':>6} {'reached':>8}")
+    for masked in (False, True):
+        r = run(masked, args.games, args.board_size, args.target_score,
+                args.seed)
+        reached = r["target_game"] if r["target_game"] else "-"
+        print(f"{'on' if masked else 'off':>5} {r['steps']:>7} "
+              f"{r['steps_per_s']:>8.0f} {r['mean_length']:>7.1f} "
+              f"{r['mean_score']:>6.2f} {reached:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Compares training in the game loop with the background learner thread.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_background_learner -seconds 20
+"""
+import argparse
+import time
+from agent import Agent
+from learner import BackgroundLearner
+from snakeAI import Snake
+from benchmarks.common import seed_torch
+
+
+def run(seconds, board_size, batch_size, train_every, background,
+        updates_per_step, seed):
+    seed_torch(seed)
+    agent = Agent(board_size=board_size, batch_size=batch_size,
+                  train_every=train_every, seed=seed)
+    learner = None
+    if background:
+        learner = BackgroundLearner(
+            agent, batch_size, updates_per_step=updates_per_step).start()
+    game = Snake(board_size, "off", False, 0, verbose=False, seed=seed)
+    steps = updates = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        state_old = game.get_state()
+        move = agent.get_action(state_old, 1000)
+        reward, done, _ = game.play_step(move)
+        updates += agent.step(state_old, move, reward, game.get_state(),
+                              done)
+        steps += 1
+        if done:
+            game.reset()
+            agent.n_games += 1
+    elapsed = time.perf_counter() - start
+    if learner:
+        learner.stop()
+        updates = learner.updates
+    return steps / elapsed, updates / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-seconds", type=float, default=20)
+    parser.add_argument("-board-size", type=int, default=10)
+    parser.add_argument("-batch-size", type=int, default=256)
+    parser.add_argument("-train-every", type=int, default=4)
+    parser.add_argument("-seed", type=int, default=0)
+    args = parser.parse_args()
+
+    ratio = 1 / args.train_every
+    configs = [
+        ("in loop", False, 0.0),
+        ("learner, capped", True, ratio),
+        ("learner, free", True, 0.0),
+    ]
+    print(f"{'mode':>16} {'steps/s':>9} {'updates/s':>10}")
+    for name, background, updates_per_step in configs:
+        steps_per_s, updates_per_s = run(
+            args.seconds, args.board_size, args.batch_size, args.train_every,
+            background, updates_per_step, args.seed)
+        print(f"{name:>16} {steps_per_s:>9.0f} {updates_per_s:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Measures the cost of a headless step as the board grows.
+
+Also times snapshot, restore and simulate against the body length,
+which should stay flat: rollouts copy the body but must not loop over
+it in Python. Run from the repository root:
+
+    python -m benchmarks.bench_board_scaling -sizes 10 42 100 256 \
+        -lengths 10 1000 5000
+"""
+import argparse
+import random
+import time
+from snakeAI import Snake, simulate
+import snake_core
+
+
+def run(board_size, steps, seed=0):
+    """
+    Plays random safe moves and times them.
+
+    Returns:
+        tuple: Microseconds per play_step, per get_state and per
+        action_mask
+    """
+    game = Snake(board_size, "off", False, 0, verbose=False, seed=seed)
+    rng = random.Random(seed)
+    play = state = mask = 0.0
+    for _ in range(steps):
+        start = time.perf_counter()
+        safe = game.action_mask()
+        masked = time.perf_counter()
+        moves = [i for i in range(3) if safe[i]] or [0]
+        action = [0, 0, 0]
+        action[rng.choice(moves)] = 1
+        before = time.perf_counter()
+        _, done, _ = game.play_step(action)
+        played = time.perf_counter()
+        game.get_state()
+        end = time.perf_counter()
+        mask += masked - start
+        play += played - before
+        state += end - played
+        if done:
+            game.reset()
+    return tuple(1e6 * total / steps for total in (play, state, mask))
+
+
+def long_body(board_size, length):
+    """
+    Serpentine body of `length` cells, head first, whose head can still
+    move forward.
+
+    Returns:
+        tuple: Body cells and the direction of the head
+    """
+    path = []
+    for y in range(board_size):
+        xs = range(board_size) if y % 2 == 0 else \
+            reversed(range(board_size))
+        path += [y * board_size + x for x in xs]
+    head, ahead = path[length - 1], path[length]
+    step = (ahead % board_size - head % board_size,
+            ahead // board_size - head // board_size)
+    return path[length - 1::-1], snake_core.STEPS.index(step)
+
+
+def run_rollouts(board_size, length, repeats, seed=0):
+    """
+    Times the rollout primitives on a snake of the given length.
+
+    Returns:
+        tuple: Microseconds per snapshot, restore and simulate
+    """
+    game = Snake(board_size, "off", False, 0, verbose=False, seed=seed)
+    cells, direction = long_body(board_size, length)
+    game.core.reset(cells, direction)
+    game.core.fill_foods()
+    state = game.snapshot()
+    move = game.core.safe_actions().index(True)
+    timings = []
+    for call in (game.snapshot, lambda: game.restore(state),
+                 lambda: simulate(state, move)):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            call()
+        timings.append(1e6 * (time.perf_counter() - start) / repeats)
+    return tuple(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-sizes", type=int, nargs="+",
+                        default=[10, 20, 42, 100, 256])
+    parser.add_argument("-steps", type=int, default=20000)
+    parser.add_argument("-lengths", type=int, nargs="+",
+                        default=[10, 1000, 5000])
+    parser.add_argument("-rollout-board", type=int, default=100)
+    parser.add_argument("-repeats", type=int, default=2000)
+    parser.add_argument("-seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'board':>6} {'step us':>8} {'state us':>9} {'mask us':>8}")
+    for size in args.sizes:
+        play, state, mask = run(size, args.steps, args.seed)
+        print(f"{size:>6} {play:>8.1f} {state:>9.1f} {mask:>8.1f}")
+
+    print(f"\n{args.rollout_board}x{args.rollout_board} board")
+    print(f"{'length':>6} {'snapshot us':>12} {'restore us':>11} "
+          f"{'simulate us':>12}")
+    for length in args.lengths:
+        snapshot, restore, step = run_rollouts(
+            args.rollout_board, length, args.repeats, args.seed)
+        print(f"{length:>6} {snapshot:>12.1f} {restore:>11.1f} "
+              f"{step:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Compares eager and compiled QTrainer steps on the CPU.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_compiled_step -batch-sizes 1 1000
+"""
+import argparse
+import time
+import numpy as np
+import torch
+from model import QNet, QTrainer
+from benchmarks.bench_train_stats import make_batch
+
+# name, compile_step, compiled batch size
+CONFIGS = (
+    ("eager", False, False),
+    ("fused adam", True, False),
+    ("compiled", True, True),
+)
+
+
+def make_trainers(batch_size, seed):
+    trainers = []
+    for _, compile_step, compiled in CONFIGS:
+        torch.manual_seed(seed)
+        trainers.append(QTrainer(
+            QNet(19, 512, 3), lr=0.001, gamma=0.9, stats_every=0,
+            compile_step=compile_step,
+            compile_sizes=(batch_size,) if compiled else ()))
+    return trainers
+
+
+def run(batch_size, steps, repeats, seed=0):
+    """
+    Returns:
+        tuple: Seconds taken by the first step of each configuration
+        (compilation included), the best time per step in
+        microseconds, and the largest difference between the eager
+        and compiled losses of the first steps
+    """
+    batch = make_batch(batch_size, np.random.default_rng(seed))
+    trainers = make_trainers(batch_size, seed)
+    first = []
+    losses = []
+    for trainer in trainers:
+        start = time.perf_counter()
+        trainer.train_step(*batch)
+        first.append(time.perf_counter() - start)
+    for trainer in trainers:
+        trainer.stats_every = 1
+        losses.append([trainer.train_step(*batch).loss for _ in range(5)])
+        trainer.stats_every = 0
+    drift = max(abs(a - b) for a, b in zip(losses[0], losses[-1]))
+
+    best = [None] * len(trainers)
+    for _ in range(repeats):
+        for i, trainer in enumerate(trainers):
+            start = time.perf_counter()
+            for _ in range(steps):
+                trainer.train_step(*batch)
+            elapsed = (time.perf_counter() - start) / steps * 1e6
+            best[i] = elapsed if best[i] is None else min(best[i], elapsed)
+    return first, best, drift
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-batch-sizes", type=int, nargs="+",
+                        default=[1, 1000])
+    parser.add_argument("-steps", type=int, default=200)
+    parser.add_argument("-repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'batch':>6} {'mode':>11} {'first s':>8} {'us/step':>8} "
+          f"{'speedup':>8}")
+    for batch_size in args.batch_sizes:
+        steps = max(1, args.steps // 10) if batch_size >= 256 else args.steps
+        first, best, drift = run(batch_size, steps, args.repeats)
+        for (name, _, _), seconds, cost in zip(CONFIGS, first, best):
+            print(f"{batch_size:>6} {name:>11} {seconds:>8.2f} {cost:>8.0f} "
+                  f"{best[0] / cost:>7.2f}x")
+        print(f"{'':>6} loss difference eager/compiled: {drift:.2e}")
+
+
+if __name__ == "__main__":
+    main()
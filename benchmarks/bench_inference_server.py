@@ -0,0 +1,107 @@
+"""
+Compares per-game forwards with the batched inference server.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_inference_server -clients 16
+"""
+import argparse
+import multiprocessing
+import threading
+import time
+import torch
+from model import QNet
+from inference_server import InferenceServer, SocketPolicy
+from snakeAI import Snake
+
+
+def play(act, steps, board_size, seed):
+    game = Snake(board_size, "off", False, 0, verbose=False, seed=seed)
+    for _ in range(steps):
+        move = act(game.get_state(), game.action_mask())
+        _, done, _ = game.play_step(move)
+        if done:
+            game.reset()
+
+
+def direct_policy(model):
+    def act(state, mask):
+        with torch.no_grad():
+            q = model(torch.tensor(state, dtype=torch.float))
+        q = q.masked_fill(~torch.tensor(mask), float("-inf"))
+        return torch.argmax(q).item()
+    return act
+
+
+def run_threads(make_act, clients, steps, board_size):
+    threads = [threading.Thread(target=play, args=(
+        make_act(), steps, board_size, seed)) for seed in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return clients * steps / (time.perf_counter() - start)
+
+
+def _socket_client(job):
+    port, steps, board_size, seed = job
+    policy = SocketPolicy(port)
+    play(policy.act, steps, board_size, seed)
+    policy.close()
+
+
+def run_processes(port, clients, steps, board_size):
+    jobs = [(port, steps, board_size, seed) for seed in range(clients)]
+    pool = multiprocessing.Pool(clients)
+    start = time.perf_counter()
+    pool.map(_socket_client, jobs)
+    elapsed = time.perf_counter() - start
+    pool.close()
+    pool.join()
+    return clients * steps / elapsed
+
+
+def report(name, steps_per_s, server=None):
+    line = f"{name:>16} {steps_per_s:>9.0f}"
+    if server:
+        s = server.stats()
+        line += (f" {s['mean_batch']:>7.1f} {100 * s['occupancy']:>5.0f}% "
+                 f"{s['p50_ms']:>7.2f} {s['p99_ms']:>7.2f}")
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-clients", type=int, default=16)
+    parser.add_argument("-steps", type=int, default=500)
+    parser.add_argument("-board-size", type=int, default=10)
+    parser.add_argument("-max-batch", type=int, default=16)
+    parser.add_argument("-max-wait", type=float, default=0.002)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    model = QNet(19, 512, 3)
+    print(f"{'mode':>16} {'steps/s':>9} {'batch':>7} {'occ':>6} "
+          f"{'p50 ms':>7} {'p99 ms':>7}")
+    report("threads, direct", run_threads(
+        lambda: direct_policy(model), args.clients, args.steps,
+        args.board_size))
+
+    server = InferenceServer(model, (19,), args.max_batch,
+                             args.max_wait).start()
+    report("threads, server", run_threads(
+        lambda: server.act, args.clients, args.steps, args.board_size),
+        server)
+    server.close()
+
+    server = InferenceServer(model, (19,), args.max_batch,
+                             args.max_wait).start()
+    port = server.serve_socket()
+    report("procs, socket", run_processes(
+        port, args.clients, args.steps, args.board_size), server)
+    server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Measures how the human game handles quick key combinations.
+
+Plays U-turns (two perpendicular key presses read in the same poll, as
+when both are pressed within one frame) at full speed with synthetic
+key events and reports how many complete, how long they take and how
+many games they end. Runs headless:
+
+    SDL_VIDEODRIVER=dummy python -m benchmarks.bench_input_latency
+"""
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+import pygame
+import snake_game
+from snake_game import SnakeGame, CLOCK_WISE, KEY_DIRECTIONS
+
+DIRECTION_KEYS = {direction: key for key, direction in KEY_DIRECTIONS.items()}
+
+
+def run(game, seconds, interval, gap):
+    """
+    Returns:
+        dict: U-turns played and completed, games lost and the median
+        and 95th percentile time from the first key to the snake
+        heading back, in milliseconds
+    """
+    game.speed = game.maxspeed
+    pending = []
+    combos = deaths = 0
+    latencies = []
+    target = None
+    start = time.perf_counter()
+    next_combo = start + interval
+    while time.perf_counter() - start < seconds:
+        now = time.perf_counter()
+        if now >= next_combo and target is None:
+            index = CLOCK_WISE.index(game.direction)
+            # Alternating sides every two U-turns keeps the snake in place.
+            side = 1 if (combos // 2) % 2 else 3
+            turn = CLOCK_WISE[(index + side) % 4]
+            target = CLOCK_WISE[(index + 2) % 4]
+            pending = [(now, turn), (now + gap, target)]
+            pressed = now
+            combos += 1
+            next_combo = now + interval
+        while pending and pending[0][0] <= now:
+            pygame.event.post(pygame.event.Event(
+                pygame.KEYDOWN, key=DIRECTION_KEYS[pending.pop(0)[1]]))
+        game.play_step()
+        if not game.game_active:
+            deaths += 1
+            target = None
+            pending = []
+            game.reset()
+            game.speed = game.maxspeed
+        elif target is not None and game.direction == target:
+            latencies.append(time.perf_counter() - pressed)
+            target = None
+    result = {"combos": combos, "completed": len(latencies),
+              "deaths": deaths}
+    if latencies:
+        p50, p95 = np.percentile(np.array(latencies) * 1000, [50, 95])
+        result.update(p50_ms=p50, p95_ms=p95)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-seconds", type=float, default=20)
+    parser.add_argument("-interval", type=float, default=0.3,
+                        help="Seconds between two U-turns")
+    parser.add_argument("-gap", type=float, default=0.0,
+                        help="Seconds between the two keys of a U-turn")
+    args = parser.parse_args()
+
+    snake_game.SCORE_FILE = os.path.join(tempfile.mkdtemp(), "score.json")
+    game = SnakeGame()
+    result = run(game, args.seconds, args.interval, args.gap)
+    print(f"{result['combos']} U-turns, {result['completed']} completed, "
+          f"{result['deaths']} games lost")
+    if "p50_ms" in result:
+        print(f"U-turn latency: median {result['p50_ms']:.1f} ms, "
+              f"p95 {result['p95_ms']:.1f} ms")
+    print("Per turn:", game.input_latency())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Compares the incremental reachability features with a BFS per step.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_reachability
+"""
+import argparse
+import random
+import time
+from dataset import heuristic_action
+from reachability import ReachabilityTracker, naive_areas
+from snakeAI import Snake
+
+
+def run(board_size, steps, seed=0):
+    game = Snake(board_size, "off", False, 0, verbose=False, seed=seed)
+    tracker = ReachabilityTracker(game.core)
+    rng = random.Random(seed)
+    incremental = naive = 0.0
+    mismatches = 0
+    lengths = 0
+    for _ in range(steps):
+        start = time.perf_counter()
+        fast = tracker.features()
+        incremental += time.perf_counter() - start
+
+        start = time.perf_counter()
+        slow = naive_areas(game.core)
+        naive += time.perf_counter() - start
+        if fast != slow:
+            mismatches += 1
+
+        lengths += game.core.length
+        move = heuristic_action(game.get_state(), 0.05, rng)
+        action = [0, 0, 0]
+        action[move] = 1
+        _, done, _ = game.play_step(action)
+        if done:
+            game.reset()
+    return {
+        "incremental_us": incremental / steps * 1e6,
+        "naive_us": naive / steps * 1e6,
+        "mean_length": lengths / steps,
+        "rebuilds": tracker.rebuilds,
+        "refills": tracker.refills,
+        "mismatches": mismatches,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-steps", type=int, default=20000)
+    parser.add_argument("-sizes", type=int, nargs="+", default=[10, 20, 42])
+    args = parser.parse_args()
+
+    print(f"{'board':>6} {'length':>7} {'incr us':>8} {'bfs us':>8} "
+          f"{'rebuilds':>9} {'refills':>8} {'mismatch':>9}")
+    for size in args.sizes:
+        r = run(size, args.steps)
+        print(f"{size:>6} {r['mean_length']:>7.1f} "
+              f"{r['incremental_us']:>8.1f} {r['naive_us']:>8.1f} "
+              f"{r['rebuilds']:>9} {r['refills']:>8} {r['mismatches']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Compares plain DQN with target networks and Double DQN.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_target_network -games 150
+"""
+import argparse
+from agent import Agent
+from benchmarks.common import seed_torch, train_headless
+
+# (name, target_update, tau, double_dqn)
+VARIANTS = [
+    ("dqn", 0, 0.0, False),
+    ("hard-100", 100, 0.0, False),
+    ("polyak", 0, 0.01, False),
+    ("double", 100, 0.0, True),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-games", type=int, default=150)
+    parser.add_argument("-sizes", type=int, nargs="+", default=[10, 20])
+    parser.add_argument("-stable-mean", type=float, default=5.0,
+                        help="Mean score over -window games to reach")
+    parser.add_argument("-window", type=int, default=20)
+    parser.add_argument("-seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'board':>5} {'variant':>9} {'steps/s':>8} {'ms/upd':>7} "
+          f"{'score':>6} {'stable':>7}")
+    for size in args.sizes:
+        for name, target_update, tau, double in VARIANTS:
+            seed_torch(args.seed)
+            agent = Agent(board_size=size, target_update=target_update,
+                          tau=tau, double_dqn=double, seed=args.seed)
+            r = train_headless(agent, size, args.games, seed=args.seed,
+                               stable_mean=args.stable_mean,
+                               window=args.window)
+            stable = r["stable_game"] if r["stable_game"] else "-"
+            print(f"{size:>5} {name:>9} {r['steps_per_s']:>8.0f} "
+                  f"{r['update_ms']:>7.2f} {r['mean_score']:>6.2f} "
+                  f"{stable:>7}")
+
+
+if __name__ == "__main__":
+    main()
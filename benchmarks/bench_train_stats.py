@@ -0,0 +1,72 @@
+"""
+Measures the cost of the QTrainer statistics.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_train_stats
+"""
+import argparse
+import time
+import numpy as np
+import torch
+from model import QNet, QTrainer
+
+SAMPLING = (0, 1, 10, 100)
+
+
+def make_batch(batch_size, rng):
+    batch = (
+        rng.integers(0, 2, (batch_size, 19)),
+        np.eye(3)[rng.integers(0, 3, batch_size)],
+        rng.normal(size=batch_size),
+        rng.integers(0, 2, (batch_size, 19)),
+        (rng.random(batch_size) < 0.1).tolist(),
+    )
+    if batch_size == 1:
+        batch = tuple(column[0] for column in batch)
+    return batch
+
+
+def run(batch_size, steps, repeats, seed=0):
+    """
+    Best time per train_step for each stats_every in SAMPLING, in
+    microseconds. The configurations run in turn within each repeat
+    so that drift in the machine load affects all of them alike.
+    """
+    rng = np.random.default_rng(seed)
+    batch = make_batch(batch_size, rng)
+    trainers = []
+    for every in SAMPLING:
+        torch.manual_seed(seed)
+        trainers.append(QTrainer(QNet(19, 512, 3), lr=0.001, gamma=0.9,
+                                 stats_every=every))
+    best = [None] * len(trainers)
+    for _ in range(repeats):
+        for i, trainer in enumerate(trainers):
+            start = time.perf_counter()
+            for _ in range(steps):
+                trainer.train_step(*batch)
+            elapsed = (time.perf_counter() - start) / steps * 1e6
+            best[i] = elapsed if best[i] is None else min(best[i], elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-steps", type=int, default=200)
+    parser.add_argument("-repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'batch':>6} {'every':>6} {'us/step':>8} {'overhead':>9}")
+    for batch_size in (1, 64, 1000):
+        steps = args.steps if batch_size < 1000 else args.steps // 10
+        times = run(batch_size, steps, args.repeats)
+        base = times[0]
+        for every, cost in zip(SAMPLING, times):
+            overhead = f"{100 * (cost / base - 1):>8.1f}%" if every else ""
+            print(f"{batch_size:>6} {every or 'off':>6} {cost:>8.1f} "
+                  f"{overhead:>9}")
+
+
+if __name__ == "__main__":
+    main()
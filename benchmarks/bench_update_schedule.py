@@ -0,0 +1,49 @@
+"""
+Compares training update schedules and n-step returns.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_update_schedule -games 100
+"""
+import argparse
+from agent import Agent
+from benchmarks.common import seed_torch, train_headless
+
+# (train_every, gradient_steps, batch_size, n_step); train_every 0 is the
+# default of one update per step plus a replay update per game.
+SCHEDULES = [
+    (0, 1, 1000, 1),
+    (0, 1, 1000, 3),
+    (4, 1, 64, 1),
+    (4, 1, 64, 3),
+    (16, 2, 128, 1),
+    (16, 2, 128, 3),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-games", type=int, default=100)
+    parser.add_argument("-board-size", type=int, default=10)
+    parser.add_argument("-target-score", type=int, default=10)
+    parser.add_argument("-seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'every':>5} {'grad':>4} {'batch':>5} {'n':>2} {'steps/s':>8} "
+          f"{'updates':>8} {'train %':>8} {'score':>6} {'reached':>8}")
+    for every, grad, batch, n_step in SCHEDULES:
+        seed_torch(args.seed)
+        agent = Agent(board_size=args.board_size, train_every=every,
+                      gradient_steps=grad, batch_size=batch, n_step=n_step,
+                      seed=args.seed)
+        r = train_headless(agent, args.board_size, args.games,
+                           target_score=args.target_score, seed=args.seed)
+        reached = r["target_game"] if r["target_game"] else "-"
+        print(f"{every:>5} {grad:>4} {batch:>5} {n_step:>2} "
+              f"{r['steps_per_s']:>8.0f} {r['updates']:>8} "
+              f"{100 * r['train_fraction']:>7.0f}% "
+              f"{r['mean_score']:>6.2f} {reached:>8}")
+
+
+if __name__ == "__main__":
+    main()
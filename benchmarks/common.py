@@ -0,0 +1,76 @@
+import time
+from collections import deque
+import torch
+from snakeAI import Snake
+
+
+def seed_torch(seed):
+    """
+    Seeds torch's global generator. The agent and the board draw from
+    their own generators derived from seed, so only torch code outside
+    them still reads global state.
+    """
+    torch.manual_seed(seed)
+
+
+def train_headless(agent, board_size, games, masked=False, target_score=None,
+                   seed=0, stable_mean=None, window=20):
+    """
+    Trains an agent on a headless board like main.run_game does.
+
+    Returns:
+        dict: steps, steps_per_s, mean_length, mean_score, updates,
+        train_fraction (share of the time spent in Agent.step and the
+        end of game updates), update_ms (mean time of those per
+        update), target_game (first game reaching target_score) and
+        stable_game (first game where the mean of the last `window`
+        scores reaches stable_mean); missing games are None
+    """
+    game = Snake(board_size, "off", False, 0, verbose=False, seed=seed)
+    steps = updates = 0
+    train_time = 0.0
+    target_game = None
+    stable_game = None
+    recent = deque(maxlen=window)
+    total_score = 0
+    start = time.perf_counter()
+    while agent.n_games < games:
+        state_old = game.get_state()
+        mask = game.action_mask() if masked else None
+        move = agent.get_action(state_old, games, mask=mask)
+        reward, done, score = game.play_step(move)
+        state_new = game.get_state()
+        next_mask = game.action_mask() if masked else None
+        steps += 1
+        update_start = time.perf_counter()
+        updates += agent.step(state_old, move, reward, state_new, done,
+                              next_mask)
+        if done:
+            game.reset()
+            agent.n_games += 1
+            if not agent.train_every:
+                agent.train_long_memory()
+                updates += 1
+        train_time += time.perf_counter() - update_start
+        if done:
+            total_score += score
+            if target_game is None and target_score and \
+                    score >= target_score:
+                target_game = agent.n_games
+            recent.append(score)
+            if stable_game is None and stable_mean is not None and \
+                    len(recent) == window and \
+                    sum(recent) / window >= stable_mean:
+                stable_game = agent.n_games
+    elapsed = time.perf_counter() - start
+    return {
+        "steps": steps,
+        "steps_per_s": steps / elapsed,
+        "mean_length": steps / games,
+        "mean_score": total_score / games,
+        "updates": updates,
+        "train_fraction": train_time / elapsed,
+        "update_ms": 1000 * train_time / max(updates, 1),
+        "target_game": target_game,
+        "stable_game": stable_game,
+    }
@@ -1,10 +1,53 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, TclError
+import multiprocessing
+from multiprocessing import forkserver
 import os
+import queue
 from types import SimpleNamespace
+from snake_core import MIN_BOARD_SIZE, MAX_BOARD_SIZE
+
+POLL_MS = 200
+# Imported by the forkserver; nothing here may open a display.
+PRELOAD = ["numpy", "torch", "matplotlib.pyplot"]
+
+
+def training_context():
+    """
+    Multiprocessing context for training runs started from the panel.
+
+    Where available, runs are forked from a forkserver that imports
+    the heavy libraries (numpy, torch, matplotlib) once, in the
+    background while the panel is open, so no run pays for those
+    imports. The game modules are left out: they initialize pygame on
+    import, and forked runs must not share the forkserver's SDL
+    display connection, so each run opens its own. Elsewhere each run
+    is spawned from scratch.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(PRELOAD)
+        forkserver.ensure_running()
+        return context
+    return multiprocessing.get_context("spawn")
 
 
 def launch_config_panel(run_game_callback, args=None):
+    """
+    Opens the configuration window.
+
+    Args:
+        run_game_callback: Module-level function running a game from an
+            args namespace (main.run_game)
+        args: Namespace with the initial values of the fields
+
+    AI games run in a worker process so the window stays responsive:
+    it shows the progress sent back by the game, can stop the run or
+    save a checkpoint of it, and can start another run when it ends.
+    """
+    context = training_context()
+    run = {"process": None, "events": None, "commands": None}
+
     root = tk.Tk()
     root.title("Game Configuration")
     root.resizable(False, False)
@@ -59,26 +102,27 @@ def launch_config_panel(run_game_callback, args=None):
         label_widget.grid(row=row, column=0, sticky="e", pady=8, padx=15)
         widget.grid(row=row, column=1, sticky="w", pady=8, padx=15)
 
-    def validate_positive_int(value, field_name):
+    def validate_positive_int(value, field_name, maximum=1000):
         if value <= 0:
             messagebox.showerror(
                 "Input Error",
                 f"{field_name} must be a positive integer"
             )
             return False
-        if value > 1000:
+        if maximum is not None and value > maximum:
             messagebox.showerror(
                 "Input Error",
-                f"{field_name} must be less than 1000"
+                f"{field_name} must be at most {maximum}"
             )
             return False
         return True
 
     def validate_board_size(value):
-        if value < 7 or value > 42:
+        if value < MIN_BOARD_SIZE or value > MAX_BOARD_SIZE:
             messagebox.showerror(
                 "Input Error",
-                "Board size must be between 10 and 42"
+                f"Board size must be between {MIN_BOARD_SIZE} and "
+                f"{MAX_BOARD_SIZE}"
             )
             return False
         return True
@@ -129,7 +173,7 @@ def launch_config_panel(run_game_callback, args=None):
 
     visual_combo = ttk.Combobox(main_frame,
                                 textvariable=visual_var,
-                                values=["on", "off"],
+                                values=["on", "off", "async"],
                                 width=10,
                                 style='Large.TCombobox')
     visual_combo.state(['readonly'])
@@ -172,7 +216,8 @@ def launch_config_panel(run_game_callback, args=None):
         main_frame, textvariable=boardsize_var,
         width=12, style='Large.TEntry'
     )
-    add_row("Board size (10–42):", boardsize_entry, row)
+    add_row(f"Board size ({MIN_BOARD_SIZE}–{MAX_BOARD_SIZE}):",
+            boardsize_entry, row)
     row += 1
 
     speed_entry = ttk.Entry(
@@ -208,12 +253,22 @@ def launch_config_panel(run_game_callback, args=None):
             )
             return
 
-        if not validate_positive_int(sessions, "Training sessions"):
+        if not validate_positive_int(sessions, "Training sessions",
+                                     maximum=None):
             return
         if not validate_board_size(board_size):
             return
         if not validate_positive_int(speed, "Game speed"):
             return
+        # Runs have no terminal: without the game window, step-by-step
+        # mode would wait for Enter on a closed stdin.
+        if step_var.get() and visual_var.get() != "on":
+            messagebox.showerror(
+                "Input Error",
+                "Step-by-step mode needs the visualisation on "
+                "(or run main.py -step-by-step from a terminal)"
+            )
+            return
 
         save_path = save_var.get() or None
         if save_path and not validate_pth_file(save_path):
@@ -223,6 +278,8 @@ def launch_config_panel(run_game_callback, args=None):
         if load_path and not validate_load_file(load_path):
             return
 
+        events = context.Queue()
+        commands = context.Queue()
         args = SimpleNamespace(
             sessions=sessions_var.get(),
             visual=visual_var.get(),
@@ -232,11 +289,77 @@ def launch_config_panel(run_game_callback, args=None):
             step_by_step=step_var.get(),
             board_size=boardsize_var.get(),
             speed=speed_var.get(),
-            game=False
+            game=False,
+            events=events,
+            commands=commands
         )
 
+        process = context.Process(target=run_game_callback, args=(args,))
+        process.start()
+        run.update(process=process, events=events, commands=commands)
+        progress_var.set("Starting...")
+        set_running(True)
+        root.after(POLL_MS, poll_progress)
+
+    def poll_progress():
+        process = run["process"]
+        if process is None:
+            return
+        while True:
+            try:
+                event = run["events"].get_nowait()
+            except queue.Empty:
+                break
+            if "summary" in event:
+                progress_var.set(event["summary"])
+            elif "checkpoint" in event:
+                status_var.set(f"Checkpoint saved to {event['checkpoint']}")
+            else:
+                progress_var.set(
+                    f"Game {event['games']}  record {event['record']}  "
+                    f"mean {event['mean']:.2f}  "
+                    f"{event['steps_per_s']:.0f} steps/s")
+        if process.is_alive():
+            root.after(POLL_MS, poll_progress)
+            return
+        process.join()
+        status_var.set(f"Run ended (exit code {process.exitcode})")
+        run.update(process=None, events=None, commands=None)
+        if save_var.get() and os.path.exists(save_var.get()):
+            load_var.set(save_var.get())
+        set_running(False)
+
+    def stop_run():
+        if run["process"] is not None:
+            run["commands"].put(("stop", None))
+            status_var.set("Stopping after the current game...")
+
+    def checkpoint_run():
+        if run["process"] is None:
+            return
+        path = filedialog.asksaveasfilename(
+            defaultextension=".pth", initialfile="checkpoint.pth")
+        if path and validate_pth_file(path):
+            run["commands"].put(("checkpoint", path))
+            status_var.set("Checkpoint requested...")
+
+    def set_running(running):
+        start_ai_button.state(["disabled"] if running else ["!disabled"])
+        start_human_button.state(["disabled"] if running else ["!disabled"])
+        stop_button.state(["!disabled"] if running else ["disabled"])
+        checkpoint_button.state(["!disabled"] if running else ["disabled"])
+        if running:
+            status_var.set("")
+
+    def close_panel():
+        process = run["process"]
+        if process is not None:
+            run["commands"].put(("stop", None))
+            process.join(5)
+            if process.is_alive():
+                process.kill()
+                process.join()
         root.destroy()
-        run_game_callback(args)
 
     start_ai_button = ttk.Button(
         main_frame, text="Start AI Game",
@@ -255,6 +378,33 @@ def launch_config_panel(run_game_callback, args=None):
         command=start_human_game, style='Large.TButton'
     )
     start_human_button.grid(row=row, column=0, columnspan=2, pady=10, ipadx=20)
+    row += 1
+
+    control_frame = ttk.Frame(main_frame)
+    stop_button = ttk.Button(
+        control_frame, text="Stop",
+        command=stop_run, style='Large.TButton'
+    )
+    stop_button.pack(side="left", padx=10)
+    checkpoint_button = ttk.Button(
+        control_frame, text="Checkpoint",
+        command=checkpoint_run, style='Large.TButton'
+    )
+    checkpoint_button.pack(side="left", padx=10)
+    control_frame.grid(row=row, column=0, columnspan=2, pady=10)
+    row += 1
+
+    progress_var = tk.StringVar(value="")
+    status_var = tk.StringVar(value="")
+    progress_label = ttk.Label(main_frame, textvariable=progress_var,
+                               style='Large.TLabel')
+    progress_label.grid(row=row, column=0, columnspan=2, pady=4)
+    row += 1
+    status_label = ttk.Label(main_frame, textvariable=status_var,
+                             style='Large.TLabel')
+    status_label.grid(row=row, column=0, columnspan=2, pady=4)
+    set_running(False)
+    root.protocol("WM_DELETE_WINDOW", close_panel)
 
     root.update_idletasks()
     width = main_frame.winfo_reqwidth() + 120
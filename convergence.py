@@ -0,0 +1,91 @@
+import math
+import torch
+from snakeAI import Snake
+
+IMPROVED, PLATEAU, REGRESSED, CONVERGED = range(4)
+
+
+class ConvergenceMonitor:
+    def __init__(self, patience=5, min_delta=0.1):
+        """
+        Decides when a training run has stopped improving.
+
+        Args:
+            patience (int): Consecutive checks without improvement after
+                which the run is considered converged
+            min_delta (float): Gain over the best value seen that counts
+                as an improvement
+
+        The monitored value is either the rolling mean training score or
+        the mean score of a greedy evaluation; each call to check
+        compares it with the best value seen so far.
+        """
+        self.patience = patience
+        self.min_delta = min_delta
+        self.best = None
+        self.bad_checks = 0
+
+    def check(self, value, spread=0.0):
+        """
+        Args:
+            value (float): Current value of the monitored score
+            spread (float): Standard error of the value, used to tell a
+                regression from noise
+
+        Returns:
+            int: IMPROVED for a new best value, PLATEAU when it stays
+            within noise of the best, REGRESSED when it falls clearly
+            below it, and CONVERGED once patience checks in a row did
+            not improve
+        """
+        if self.best is None or value > self.best + self.min_delta:
+            self.best = value
+            self.bad_checks = 0
+            return IMPROVED
+        self.bad_checks += 1
+        if self.bad_checks >= self.patience:
+            return CONVERGED
+        if value < self.best - max(self.min_delta, 2 * spread):
+            return REGRESSED
+        return PLATEAU
+
+
+def rolling_spread(stats):
+    """
+    Standard error of the rolling mean of a RunStats.
+    """
+    n = len(stats.recent)
+    return stats.rolling_std / math.sqrt(n) if n else 0.0
+
+
+def evaluate_greedy(agent, board_size, seeds, observation="features",
+                    reachability=False, action_mask=False):
+    """
+    Plays one greedy game (no exploration, no learning) per seed.
+
+    Args:
+        agent: Agent to evaluate
+        board_size (int): Size of the evaluation boards
+        seeds: Seeds of the boards, so every evaluation plays the same
+            starting positions and food placements
+        observation (str): "features" or "grid", as given to the agent
+        reachability (bool): Whether the agent expects reachability
+            features
+        action_mask (bool): Whether fatal actions are masked
+
+    Returns:
+        float: Mean score over the boards
+    """
+    total = 0
+    for seed in seeds:
+        game = Snake(board_size, "off", False, 0, verbose=False, seed=seed,
+                     reachability=reachability)
+        observe = game.get_grid if observation == "grid" else game.get_state
+        done = False
+        with torch.no_grad():
+            while not done:
+                mask = game.action_mask() if action_mask else None
+                move = agent.get_action(observe(), 1, True, mask)
+                _, done, score = game.play_step(move)
+        total += score
+    return total / len(seeds)
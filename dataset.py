@@ -0,0 +1,214 @@
+import argparse
+import os
+import random
+import multiprocessing
+import numpy as np
+from snakeAI import Snake
+from seeding import spawn_seeds, int_seed
+
+STATE_SIZE = 19
+
+# Relative actions as indices into the one-hot [straight, right, left].
+STRAIGHT, RIGHT, LEFT = 0, 1, 2
+
+# Absolute directions in the order used by get_state: left, right, up, down.
+# For each current direction, maps an absolute target direction
+# to the relative action that reaches it (None means a reversal).
+_TURNS = {
+    0: {0: STRAIGHT, 1: None, 2: RIGHT, 3: LEFT},
+    1: {0: None, 1: STRAIGHT, 2: LEFT, 3: RIGHT},
+    2: {0: LEFT, 1: RIGHT, 2: STRAIGHT, 3: None},
+    3: {0: RIGHT, 1: LEFT, 2: None, 3: STRAIGHT},
+}
+
+
+def heuristic_action(state, explore=0.0, rng=random):
+    """
+    Scripted policy that greedily heads for the first visible green apple.
+
+    Args:
+        state: Feature vector as returned by Snake.get_state
+        explore (float): Probability of taking a random safe action
+        rng: Random number generator used for exploration
+
+    Returns:
+        int: Index of the relative action (straight, right, left)
+
+    Only the danger bits and the green apple bits of the state are used,
+    so the policy sees exactly what the agent sees. Dangerous moves are
+    avoided whenever a safe alternative exists.
+    """
+    danger = state[0:3]
+    safe = [a for a in (STRAIGHT, RIGHT, LEFT) if not danger[a]]
+    if not safe:
+        return STRAIGHT
+    if explore and rng.random() < explore:
+        return rng.choice(safe)
+
+    current = int(np.argmax(state[3:7]))
+    for apple in (state[7:11], state[11:15]):
+        for target in np.flatnonzero(apple):
+            action = _TURNS[current][int(target)]
+            if action is not None and action in safe:
+                return action
+    return STRAIGHT if STRAIGHT in safe else safe[0]
+
+
+def _generate_worker(job):
+    games, board_size, explore, seed = job
+    game_seed, policy_seed = spawn_seeds(seed, 2)
+    rng = random.Random(int_seed(policy_seed))
+    game = Snake(board_size, "off", False, 0, verbose=False,
+                 seed=int_seed(game_seed))
+
+    states, actions, rewards, next_states, dones = [], [], [], [], []
+    played = 0
+    state = game.get_state()
+    while played < games:
+        move = heuristic_action(state, explore, rng)
+        final_move = [0, 0, 0]
+        final_move[move] = 1
+        reward, done, _ = game.play_step(final_move)
+        next_state = game.get_state()
+
+        states.append(state)
+        actions.append(move)
+        rewards.append(reward)
+        next_states.append(next_state)
+        dones.append(done)
+
+        if done:
+            played += 1
+            game.reset()
+            next_state = game.get_state()
+        state = next_state
+
+    return (
+        np.packbits(np.array(states, dtype=bool), axis=1),
+        np.array(actions, dtype=np.uint8),
+        np.array(rewards, dtype=np.int8),
+        np.packbits(np.array(next_states, dtype=bool), axis=1),
+        np.array(dones, dtype=bool),
+    )
+
+
+def generate_dataset(path, games, board_size=10, workers=None,
+                     explore=0.1, seed=0):
+    """
+    Plays games with the heuristic policy and saves every transition.
+
+    Args:
+        path (str): Destination .npz file
+        games (int): Total number of games to play
+        board_size (int): Size of the board
+        workers (int): Number of processes, defaults to the CPU count
+        explore (float): Random action probability of the policy
+        seed (int): Base seed, each worker gets an independent stream
+            spawned from it
+
+    Returns:
+        int: Number of transitions written
+
+    Raises:
+        ValueError: games or workers is below 1
+
+    States are stored bit-packed (3 bytes for the 19 features),
+    actions as indices and rewards as int8, so a transition takes
+    under 10 bytes before compression.
+    """
+    if games < 1:
+        raise ValueError(f"games must be at least 1, got {games}")
+    if workers is not None and workers < 1:
+        raise ValueError(f"workers must be at least 1, got {workers}")
+    workers = workers or os.cpu_count() or 1
+    # No idle processes when there are fewer games than workers.
+    workers = min(workers, games)
+    jobs = [
+        (games // workers + (i < games % workers), board_size, explore,
+         worker_seed)
+        for i, worker_seed in enumerate(spawn_seeds(seed, workers))
+    ]
+    # SDL traps SIGTERM once pygame is initialised, so the pool is shut
+    # down with close/join instead of the terminate done by its context
+    # manager, which would wait forever on the workers.
+    pool = multiprocessing.Pool(workers)
+    try:
+        parts = pool.map(_generate_worker, jobs)
+    finally:
+        pool.close()
+        pool.join()
+
+    columns = [np.concatenate(column) for column in zip(*parts)]
+    folder = os.path.dirname(path)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+    np.savez_compressed(
+        path,
+        states=columns[0],
+        actions=columns[1],
+        rewards=columns[2],
+        next_states=columns[3],
+        dones=columns[4],
+    )
+    return len(columns[1])
+
+
+def load_dataset(path):
+    """
+    Loads a dataset written by generate_dataset.
+
+    Args:
+        path (str): Path to the .npz file
+
+    Returns:
+        tuple: (states, actions, rewards, next_states, dones) where
+        states are unpacked uint8 feature vectors and actions are
+        one-hot encoded like Agent.get_action
+    """
+    with np.load(path) as data:
+        states = np.unpackbits(data["states"], axis=1)[:, :STATE_SIZE]
+        next_states = np.unpackbits(
+            data["next_states"], axis=1)[:, :STATE_SIZE]
+        actions = np.eye(3, dtype=np.uint8)[data["actions"]]
+        rewards = data["rewards"].astype(np.float32)
+        dones = data["dones"].copy()
+    return states, actions, rewards, next_states, dones
+
+
+def positive_count(value):
+    """
+    Custom type for positive integers (games, workers).
+    """
+    ivalue = int(value)
+    if ivalue <= 0:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive integer")
+    return ivalue
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Generate a heuristic dataset for pretraining")
+    parser.add_argument("-out", type=str, required=True,
+                        help="Path of the .npz dataset to write")
+    parser.add_argument("-games", type=positive_count, default=1000,
+                        help="Number of games to play")
+    parser.add_argument("-board-size", type=int, default=10,
+                        help="Size of the board")
+    parser.add_argument("-workers", type=positive_count, default=None,
+                        help="Number of worker processes")
+    parser.add_argument("-explore", type=float, default=0.1,
+                        help="Probability of a random safe action")
+    parser.add_argument("-seed", type=int, default=0,
+                        help="Base random seed")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    count = generate_dataset(args.out, args.games, args.board_size,
+                             args.workers, args.explore, args.seed)
+    print(f"Wrote {count} transitions to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import os
+import struct
+import numpy as np
+
+STATE_SIZE = 19
+MAGIC = b"L2SDEMO1"
+
+# One human step: packed state, action index, reward, packed next state
+# and the done flag. 9 bytes per transition.
+_RECORD = struct.Struct("<3sBb3s?")
+_RECORD_DTYPE = np.dtype([
+    ("state", "u1", 3),
+    ("action", "u1"),
+    ("reward", "i1"),
+    ("next_state", "u1", 3),
+    ("done", "?"),
+])
+
+
+def _pack_state(state):
+    return np.packbits(np.asarray(state, dtype=bool)).tobytes()
+
+
+class DemoRecorder:
+    def __init__(self, path, buffer_size=1 << 16):
+        """
+        Records human transitions to a binary demonstration file.
+
+        Args:
+            path (str): File to append the demonstrations to
+            buffer_size (int): Size in bytes of the write buffer
+
+        Records are appended through a buffered writer, so a step only
+        costs a struct pack and a memory copy; the file is touched once
+        every few thousand steps and when the recorder is closed.
+        """
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.path = path
+        self._file = open(path, "ab", buffering=buffer_size)
+        if new_file:
+            self._file.write(MAGIC)
+        self.count = 0
+
+    def record(self, state, action, reward, next_state, done):
+        """
+        Appends one transition.
+
+        Args:
+            state: 19-feature state before the move
+            action (int): Relative action index (straight, right, left)
+            reward (int): Reward of the move
+            next_state: 19-feature state after the move
+            done (bool): Whether the move ended the game
+        """
+        self._file.write(_RECORD.pack(
+            _pack_state(state), action, reward,
+            _pack_state(next_state), done))
+        self.count += 1
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+def iter_demonstrations(path, chunk_size=4096):
+    """
+    Streams the transitions stored in a demonstration file.
+
+    Args:
+        path (str): File written by DemoRecorder
+        chunk_size (int): Number of records decoded at once
+
+    Yields:
+        tuple: (state, action, reward, next_state, done) in the format
+        used by Agent.remember, with the action one-hot encoded
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a demonstration file")
+        while True:
+            data = f.read(chunk_size * _RECORD.size)
+            if not data:
+                break
+            usable = len(data) - len(data) % _RECORD.size
+            records = np.frombuffer(data[:usable], dtype=_RECORD_DTYPE)
+            states = np.unpackbits(records["state"], axis=1)[:, :STATE_SIZE]
+            next_states = np.unpackbits(
+                records["next_state"], axis=1)[:, :STATE_SIZE]
+            for i in range(len(records)):
+                action = [0, 0, 0]
+                action[records["action"][i]] = 1
+                yield (states[i], action, int(records["reward"][i]),
+                       next_states[i], bool(records["done"][i]))
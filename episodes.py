@@ -0,0 +1,216 @@
+import heapq
+import os
+import struct
+
+MAGIC = b"L2SEPIS2"
+# Archives of the first version store the body length as a uint16.
+MAGIC_V1 = b"L2SEPIS1"
+
+_HEADER = struct.Struct("<HBI")
+_HEADER_V1 = struct.Struct("<HBH")
+_CELL = struct.Struct("<H")
+_FOOD = struct.Struct("<HB")
+_ENTRY = struct.Struct("<iII")
+
+SPAWN_FLAG = 0x04
+
+DIRECTIONS = ["RIGHT", "LEFT", "UP", "DOWN"]
+
+
+class Episode:
+    def __init__(self, board_size, direction, body, foods, actions, spawns,
+                 score):
+        """
+        A decoded episode.
+
+        Args:
+            board_size (int): Number of cells per side
+            direction (str): Name of the initial Direction
+            body (list): Initial body cells, head first
+            foods (list): Initial (cell, food type value) pairs
+            actions (list): Relative action index of every step
+            spawns (dict): Step index -> (cell, food type value) of the
+                food placed during that step
+            score (int): Final score
+        """
+        self.board_size = board_size
+        self.direction = direction
+        self.body = body
+        self.foods = foods
+        self.actions = actions
+        self.spawns = spawns
+        self.score = score
+
+
+def _cell(game, point):
+    return point.y * game.num_cells + point.x
+
+
+class EpisodeRecorder:
+    def __init__(self, archive):
+        """
+        Encodes the episodes played on a Snake into an EpisodeArchive.
+
+        Args:
+            archive: EpisodeArchive receiving every finished episode
+
+        An episode is the initial board followed by one byte per step
+        holding the relative action. When a food is placed during the
+        step a flag bit is set and its cell and type follow (3 bytes),
+        so the random placements can be replayed exactly.
+        """
+        self.archive = archive
+        self._data = None
+        self._foods = None
+
+    def start(self, game):
+        """
+        Captures the initial board; call it after every Snake.reset.
+        """
+        self._foods = set(game.foods)
+        data = bytearray(_HEADER.pack(
+            game.num_cells, DIRECTIONS.index(game.direction.name),
+            len(game.snake)))
+        for pt in game.snake:
+            data += _CELL.pack(_cell(game, pt))
+        data.append(len(game.foods))
+        for pt, food_type in game.foods:
+            data += _FOOD.pack(_cell(game, pt), food_type.value)
+        self._steps = 0
+        self._data = data
+
+    def step(self, game, action, done):
+        """
+        Records one step; call it right after Snake.play_step.
+
+        Args:
+            game: The Snake that played the step
+            action: One-hot action passed to play_step
+            done (bool): Whether the step ended the episode
+        """
+        code = list(action).index(1)
+        foods = set(game.foods)
+        spawned = foods - self._foods
+        self._foods = foods
+        if spawned:
+            pt, food_type = spawned.pop()
+            self._data.append(code | SPAWN_FLAG)
+            self._data += _FOOD.pack(_cell(game, pt), food_type.value)
+        else:
+            self._data.append(code)
+        self._steps += 1
+        if done:
+            self.archive.add(game.score, self._steps, bytes(self._data))
+            self._data = None
+
+
+class EpisodeArchive:
+    def __init__(self, path, keep=None):
+        """
+        Stores recorded episodes in a single file.
+
+        Args:
+            path (str): Destination file
+            keep (int): If set, only the `keep` best and `keep` worst
+                episodes (by score) are retained and written on close;
+                otherwise every episode is appended as it finishes
+        """
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        self.path = path
+        self.keep = keep
+        self._best = []
+        self._worst = []
+        self._count = 0
+        self._file = None
+        if keep is None:
+            self._file = open(path, "wb")
+            self._file.write(MAGIC)
+
+    def add(self, score, steps, data):
+        self._count += 1
+        entry = (score, self._count, steps, data)
+        if self._file is not None:
+            self._write(self._file, entry)
+            return
+        if len(self._best) < self.keep:
+            heapq.heappush(self._best, entry)
+        else:
+            heapq.heappushpop(self._best, entry)
+        worst = (-score, self._count, steps, data)
+        if len(self._worst) < self.keep:
+            heapq.heappush(self._worst, worst)
+        else:
+            heapq.heappushpop(self._worst, worst)
+
+    @staticmethod
+    def _write(f, entry):
+        score, _, steps, data = entry
+        f.write(_ENTRY.pack(score, steps, len(data)))
+        f.write(data)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            return
+        if self.keep is None:
+            return
+        entries = {entry[1]: entry for entry in self._best}
+        for score, index, steps, data in self._worst:
+            entries[index] = (-score, index, steps, data)
+        with open(self.path, "wb") as f:
+            f.write(MAGIC)
+            for index in sorted(entries):
+                self._write(f, entries[index])
+        self.keep = None
+
+
+def _decode(data, score, layout=_HEADER):
+    board_size, direction, length = layout.unpack_from(data, 0)
+    offset = layout.size
+    body = []
+    for _ in range(length):
+        body.append(_CELL.unpack_from(data, offset)[0])
+        offset += _CELL.size
+    foods = []
+    for _ in range(data[offset]):
+        foods.append(_FOOD.unpack_from(data, offset + 1))
+        offset += _FOOD.size
+    offset += 1
+
+    actions = []
+    spawns = {}
+    while offset < len(data):
+        code = data[offset]
+        offset += 1
+        if code & SPAWN_FLAG:
+            spawns[len(actions)] = _FOOD.unpack_from(data, offset)
+            offset += _FOOD.size
+        actions.append(code & 0x03)
+    return Episode(board_size, DIRECTIONS[direction], body, foods, actions,
+                   spawns, score)
+
+
+def read_episodes(path):
+    """
+    Reads the episodes of an archive.
+
+    Args:
+        path (str): File written by EpisodeArchive
+
+    Yields:
+        Episode: Each stored episode in the order it was played
+    """
+    with open(path, "rb") as f:
+        magic = f.read(len(MAGIC))
+        if magic not in (MAGIC, MAGIC_V1):
+            raise ValueError(f"{path} is not an episode archive")
+        layout = _HEADER if magic == MAGIC else _HEADER_V1
+        while True:
+            header = f.read(_ENTRY.size)
+            if len(header) < _ENTRY.size:
+                break
+            score, _, size = _ENTRY.unpack(header)
+            yield _decode(f.read(size), score, layout)
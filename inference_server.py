@@ -0,0 +1,291 @@
+import asyncio
+import socket
+import struct
+import threading
+import time
+from collections import deque
+import numpy as np
+import torch
+
+# Socket request: payload size in bytes and whether a 3-byte action
+# mask follows the float32 observation. The answer is the action index.
+_REQUEST = struct.Struct("<I?")
+_ANSWER = struct.Struct("<B")
+_MASK_SIZE = 3
+
+
+class InferenceServer:
+    def __init__(self, model, obs_shape, max_batch=64, max_wait=0.002,
+                 latency_window=10000):
+        """
+        Batches greedy action requests from many games into one forward.
+
+        Args:
+            model: Q-network answering the requests
+            obs_shape (tuple): Shape of one observation, e.g. (19,)
+            max_batch (int): Largest number of observations per forward
+            max_wait (float): Seconds the oldest pending request may wait
+                for the batch to fill up before it is run anyway
+            latency_window (int): Number of recent request latencies kept
+                for the percentiles of stats()
+
+        The server runs an asyncio event loop in a background thread.
+        Games in other threads call act, remote games connect to
+        serve_socket with SocketPolicy, and coroutines already running
+        on the loop can await infer. A batch runs as soon as max_batch
+        requests are pending or the oldest one has waited max_wait.
+        """
+        self.model = model
+        self.obs_shape = tuple(obs_shape)
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.requests = 0
+        self.batches = 0
+        self.latencies = deque(maxlen=latency_window)
+        self._pending = []
+        self._has_work = None
+        self._full = None
+        self._loop = None
+        self._thread = None
+        self._batcher = None
+        self._socket_server = None
+        self._closed = False
+        self._lock = threading.Lock()
+        self._waiting = set()
+
+    # Event loop
+
+    def start(self):
+        """
+        Starts the event loop thread; returns the server.
+        """
+        self._loop = asyncio.new_event_loop()
+        self._closed = False
+        ready = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            self._has_work = asyncio.Event()
+            self._full = asyncio.Event()
+            self._batcher = self._loop.create_task(self._batch_loop())
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def close(self):
+        """
+        Stops the event loop thread. Requests still pending, and those
+        made while closing, fail with a RuntimeError instead of waiting
+        forever for a batch that will not run.
+        """
+        if self._loop is None:
+            return
+        with self._lock:
+            self._closed = True
+
+        async def stop():
+            self._batcher.cancel()
+            self._fail_pending()
+            if self._socket_server is not None:
+                self._socket_server.close()
+                await self._socket_server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(stop(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        # act calls whose infer never got to run before the loop stopped.
+        with self._lock:
+            for future in self._waiting:
+                if not future.done():
+                    future.set_exception(_closed_error())
+        self._loop.close()
+        self._loop = None
+
+    def _fail_pending(self):
+        pending, self._pending = self._pending, []
+        for _, _, _, future in pending:
+            if not future.done():
+                future.set_exception(_closed_error())
+        self._has_work.clear()
+        self._full.clear()
+
+    # Requests
+
+    async def infer(self, observation, mask=None):
+        """
+        Greedy action for one observation, from a coroutine on the
+        server loop.
+
+        Args:
+            observation: Array of shape obs_shape
+            mask: Optional boolean [straight, right, left] array of the
+                allowed actions (ignored when none is allowed)
+
+        Returns:
+            int: Index of the chosen action
+
+        Raises:
+            RuntimeError: The server is closed or closes before the
+                request is answered
+        """
+        if self._closed:
+            raise _closed_error()
+        future = self._loop.create_future()
+        self._pending.append(
+            (observation, mask, time.perf_counter(), future))
+        self._has_work.set()
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+        return await future
+
+    def act(self, observation, mask=None):
+        """
+        Thread-safe, blocking version of infer for games running in
+        other threads.
+        """
+        with self._lock:
+            if self._closed:
+                raise _closed_error()
+            future = asyncio.run_coroutine_threadsafe(
+                self.infer(observation, mask), self._loop)
+            self._waiting.add(future)
+        try:
+            return future.result()
+        finally:
+            with self._lock:
+                self._waiting.discard(future)
+
+    async def _batch_loop(self):
+        while True:
+            await self._has_work.wait()
+            if len(self._pending) < self.max_batch:
+                oldest = self._pending[0][2]
+                remaining = oldest + self.max_wait - time.perf_counter()
+                if remaining > 0:
+                    try:
+                        await asyncio.wait_for(self._full.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        pass
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            if not self._pending:
+                self._has_work.clear()
+            if len(self._pending) < self.max_batch:
+                self._full.clear()
+            self._run(batch)
+
+    def _run(self, batch):
+        states = torch.tensor(np.stack([np.asarray(item[0], dtype=np.float32)
+                                        for item in batch]))
+        with torch.no_grad():
+            q = self.model(states)
+        if any(item[1] is not None for item in batch):
+            masks = np.ones((len(batch), _MASK_SIZE), dtype=bool)
+            for i, item in enumerate(batch):
+                if item[1] is not None and np.any(item[1]):
+                    masks[i] = item[1]
+            q = q.masked_fill(~torch.from_numpy(masks), float("-inf"))
+        actions = torch.argmax(q, dim=1).tolist()
+
+        now = time.perf_counter()
+        for (_, _, start, future), action in zip(batch, actions):
+            if not future.done():
+                future.set_result(action)
+            self.latencies.append(now - start)
+        self.requests += len(batch)
+        self.batches += 1
+
+    def stats(self):
+        """
+        Returns:
+            dict: requests, batches, mean batch size, occupancy (mean
+            batch size / max_batch) and p50/p95/p99 request latency in
+            milliseconds over the last latency_window requests
+        """
+        mean_batch = self.requests / self.batches if self.batches else 0.0
+        result = {
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch": mean_batch,
+            "occupancy": mean_batch / self.max_batch,
+        }
+        if self.latencies:
+            p50, p95, p99 = np.percentile(
+                np.array(self.latencies) * 1000, [50, 95, 99])
+            result.update(p50_ms=float(p50), p95_ms=float(p95),
+                          p99_ms=float(p99))
+        return result
+
+    # Socket
+
+    def serve_socket(self, port=0, host="127.0.0.1"):
+        """
+        Accepts SocketPolicy clients on a local TCP port.
+
+        Returns:
+            int: The port listened on (useful when port is 0)
+        """
+        async def open_server():
+            return await asyncio.start_server(self._handle_client, host,
+                                              port)
+
+        self._socket_server = asyncio.run_coroutine_threadsafe(
+            open_server(), self._loop).result()
+        return self._socket_server.sockets[0].getsockname()[1]
+
+    async def _handle_client(self, reader, writer):
+        try:
+            while True:
+                header = await reader.readexactly(_REQUEST.size)
+                size, has_mask = _REQUEST.unpack(header)
+                observation = np.frombuffer(
+                    await reader.readexactly(size),
+                    dtype=np.float32).reshape(self.obs_shape)
+                mask = None
+                if has_mask:
+                    mask = np.frombuffer(
+                        await reader.readexactly(_MASK_SIZE), dtype=bool)
+                action = await self.infer(observation, mask)
+                writer.write(_ANSWER.pack(action))
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        except RuntimeError:
+            # The server closed; the client sees the connection drop.
+            pass
+        finally:
+            writer.close()
+
+
+def _closed_error():
+    return RuntimeError("Inference server closed")
+
+
+class SocketPolicy:
+    def __init__(self, port, host="127.0.0.1"):
+        """
+        Blocking client of InferenceServer.serve_socket, for games
+        running in other processes.
+        """
+        self.sock = socket.create_connection((host, port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def act(self, observation, mask=None):
+        data = np.ascontiguousarray(observation, dtype=np.float32).tobytes()
+        message = _REQUEST.pack(len(data), mask is not None) + data
+        if mask is not None:
+            message += np.asarray(mask, dtype=bool).tobytes()
+        self.sock.sendall(message)
+        answer = b""
+        while len(answer) < _ANSWER.size:
+            chunk = self.sock.recv(_ANSWER.size - len(answer))
+            if not chunk:
+                raise ConnectionError("Inference server closed the connection")
+            answer += chunk
+        return _ANSWER.unpack(answer)[0]
+
+    def close(self):
+        self.sock.close()
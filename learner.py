@@ -0,0 +1,128 @@
+import copy
+import threading
+import time
+import torch
+
+
+class BackgroundLearner:
+    def __init__(self, agent, batch_size=1000, sync_every=10, min_memory=1,
+                 updates_per_step=0.0):
+        """
+        Trains an agent from its replay memory on a separate thread.
+
+        Args:
+            agent: Agent to train; it is attached to the learner, so
+                Agent.step only stores transitions and Agent.get_action
+                acts with the published weights
+            batch_size (int): Transitions per replay update
+            sync_every (int): Updates between two weight publications
+            min_memory (int): Transitions stored before training starts
+            updates_per_step (float): If set, the learner waits whenever
+                it is more than this many updates per environment step
+                ahead, which caps the replay ratio
+
+        The learner owns agent.model. Acting uses one of two frozen
+        copies: weights are copied into the copy that is not being
+        acted with and the copies are then swapped, so the game never
+        sees half-written weights and never waits for an update. Torch
+        releases the GIL inside its kernels, so playing and training
+        overlap. The replay memory is shared under a lock that is only
+        held to store a transition or draw a batch.
+        """
+        self.agent = agent
+        self.batch_size = batch_size
+        self.sync_every = sync_every
+        self.min_memory = min_memory
+        self.updates_per_step = updates_per_step
+        self.lock = threading.Lock()
+        self.updates = 0
+        self.publications = 0
+
+        self._buffers = [copy.deepcopy(agent.model) for _ in range(2)]
+        for model in self._buffers:
+            model.requires_grad_(False)
+        self._front = 0
+        self._in_use = None
+        self._swap_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.agent.learner = self
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops the thread and detaches the learner; agent.model then holds
+        the latest weights.
+        """
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.agent.learner = None
+
+    # Acting side
+
+    def predict(self, state):
+        """
+        Q-values from the published weights.
+        """
+        with self._swap_lock:
+            index = self._front
+            self._in_use = index
+        try:
+            with torch.no_grad():
+                return self._buffers[index](state)
+        finally:
+            with self._swap_lock:
+                self._in_use = None
+
+    def published_models(self):
+        """
+        Returns the two frozen copies acting uses, e.g. to account for
+        their memory. They must not be modified.
+        """
+        return tuple(self._buffers)
+
+    def save(self, file_name):
+        with self._swap_lock:
+            index = self._front
+            self._in_use = index
+        try:
+            self._buffers[index].save(file_name)
+        finally:
+            with self._swap_lock:
+                self._in_use = None
+
+    # Learning side
+
+    def _publish(self):
+        with self._swap_lock:
+            back = 1 - self._front
+            if self._in_use == back:
+                return False
+        # Only the front copy can be picked up while this one is written.
+        self._buffers[back].load_state_dict(self.agent.model.state_dict())
+        with self._swap_lock:
+            self._front = back
+        self.publications += 1
+        return True
+
+    def _run(self):
+        agent = self.agent
+        while not self._stop.is_set():
+            if len(agent.memory) < self.min_memory or (
+                    self.updates_per_step and
+                    self.updates >= self.updates_per_step * agent.steps):
+                time.sleep(0.001)
+                continue
+            with self.lock:
+                batch = agent.sample_batch(self.batch_size)
+            agent.train_batch(batch)
+            self.updates += 1
+            if self.updates % self.sync_every == 0:
+                self._publish()
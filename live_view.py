@@ -0,0 +1,114 @@
+import multiprocessing
+import queue
+import time
+from array import array
+
+
+def _render_loop(frames, board_size, max_fps):
+    import pygame
+    from snakeAI import make_board_renderer, FoodType, board_pixels
+
+    block_size, size = board_pixels(board_size)
+    display = pygame.display.set_mode((size, size))
+    pygame.display.set_caption('Snake (live)')
+    renderer = make_board_renderer(display, block_size)
+    clock = pygame.time.Clock()
+    kinds = {kind.value: kind for kind in FoodType}
+
+    while True:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                return
+        try:
+            frame = frames.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        try:
+            # Only the newest snapshot is worth drawing.
+            while True:
+                frame = frames.get_nowait()
+        except queue.Empty:
+            pass
+        if frame is None:
+            pygame.quit()
+            return
+
+        score, body, foods = frame
+        cells = array('H')
+        cells.frombytes(body)
+        renderer.draw(
+            [(c % board_size, c // board_size) for c in cells],
+            [((c % board_size, c // board_size), kinds[k]) for c, k in foods],
+            score)
+        clock.tick(max_fps)
+
+
+class LiveView:
+    def __init__(self, board_size, max_fps=30, every=0):
+        """
+        Shows the game in a separate process while it runs at full speed.
+
+        Args:
+            board_size (int): Number of cells per side
+            max_fps (int): Maximum number of frames drawn per second
+            every (int): If positive, send every Nth step instead of
+                limiting by time
+
+        The simulation only packs a snapshot (score, body cells as a
+        uint16 array and food cells) and hands it to a queue without
+        waiting. When the display process falls behind, new snapshots
+        are dropped on the sending side and stale ones are discarded on
+        the receiving side, so the game loop never blocks on drawing.
+        """
+        self.board_size = board_size
+        self.every = every
+        self.interval = 1.0 / max_fps if max_fps > 0 else 0.0
+        self._last_sent = 0.0
+        self._steps = 0
+        ctx = multiprocessing.get_context("spawn")
+        self._frames = ctx.Queue(maxsize=2)
+        self._process = ctx.Process(
+            target=_render_loop,
+            args=(self._frames, board_size, max_fps),
+            daemon=True,
+        )
+        self._process.start()
+
+    def wants_frame(self):
+        """
+        Tells whether the current step should be shown. Callers check
+        it before building a snapshot, so skipped steps cost nothing.
+        """
+        self._steps += 1
+        if self.every > 0:
+            return self._steps % self.every == 0
+        now = time.perf_counter()
+        if now - self._last_sent < self.interval:
+            return False
+        self._last_sent = now
+        return True
+
+    def submit(self, cells, foods, score):
+        """
+        Offers a board snapshot to the display process.
+
+        Args:
+            cells: Body cells as y * board_size + x, head first
+            foods: Iterable of (cell, food type value) pairs
+            score (int): Current score
+        """
+        frame = (score, array('H', cells).tobytes(), list(foods))
+        try:
+            self._frames.put_nowait(frame)
+        except queue.Full:
+            pass
+
+    def close(self):
+        if self._process.is_alive():
+            try:
+                self._frames.put(None, timeout=1)
+            except queue.Full:
+                pass
+            self._process.join(timeout=2)
+        self._frames.cancel_join_thread()
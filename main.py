@@ -1,12 +1,29 @@
 import argparse
 import os
-from agent import Agent
+import queue
+import random
+import time
+from agent import Agent, BATCH_SIZE
+from model import TrainStats
 from snakeAI import Snake
+from snake_core import MIN_BOARD_SIZE, MAX_BOARD_SIZE
 from plot import plot
 from config_panel import launch_config_panel
+from episodes import EpisodeArchive, EpisodeRecorder
+from stats import RunStats
+from metrics import MetricsLog
+from metrics_server import TrainingMetrics, MetricsServer
+from learner import BackgroundLearner
+from memory_report import MemoryReporter
+from seeding import spawn_seeds, int_seed
+from convergence import (ConvergenceMonitor, evaluate_greedy, rolling_spread,
+                         IMPROVED, REGRESSED, CONVERGED)
 import pygame
 import matplotlib.pyplot as plt
 
+# Logged for games without any sampled update.
+NO_TRAIN_STATS = TrainStats(*[float("nan")] * len(TrainStats._fields))
+
 
 def pth_file(value):
     """
@@ -31,12 +48,43 @@ def positive_int(value):
     return ivalue
 
 
+def session_count(value):
+    """
+    Custom type for positive integers without the upper limit of
+    positive_int (sessions, batch sizes, scores).
+    """
+    ivalue = int(value)
+    if ivalue <= 0:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive integer")
+    return ivalue
+
+
+def non_negative_int(value):
+    """
+    Custom type for counts where 0 turns the feature off.
+    """
+    ivalue = int(value)
+    if ivalue < 0:
+        raise argparse.ArgumentTypeError(f"{value} is not 0 or more")
+    return ivalue
+
+
+def positive_float(value):
+    """
+    Custom type for positive numbers.
+    """
+    fvalue = float(value)
+    if fvalue <= 0:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive number")
+    return fvalue
+
+
 def board_size_type(value):
     """
     Custom type for board size.
     """
     ivalue = int(value)
-    if ivalue < 7 or ivalue > 42:
+    if ivalue < MIN_BOARD_SIZE or ivalue > MAX_BOARD_SIZE:
         raise argparse.ArgumentTypeError(f"{value} is not a valid board size")
     return ivalue
 
@@ -45,16 +93,130 @@ def parse_args():
     parser = argparse.ArgumentParser(description="Learn2Slither")
     parser.add_argument(
         "-sessions",
-        type=positive_int,
+        type=session_count,
+        default=None,
+        help="Number training session (10 when no other limit is given)",
+    )
+    parser.add_argument(
+        "-time-budget",
+        type=positive_float,
+        default=None,
+        help="Stops training after this many seconds",
+    )
+    parser.add_argument(
+        "-target-mean",
+        type=float,
+        default=None,
+        help="Stops training once the mean score of the last "
+             "-stats-window games reaches this value",
+    )
+    parser.add_argument(
+        "-stats-window",
+        type=session_count,
+        default=100,
+        help="Number of recent games used for the rolling mean and plot",
+    )
+    parser.add_argument(
+        "-metrics",
+        type=str,
+        default=None,
+        help="Path of a columnar log of per-game metrics "
+             "(read it with metrics.read_metrics)",
+    )
+    parser.add_argument(
+        "-train-stats-every",
+        type=non_negative_int,
         default=10,
-        help="Number training session",
+        help="Computes loss, Q-value, TD error and gradient statistics "
+             "every N updates (0 disables them)",
+    )
+    parser.add_argument(
+        "-metrics-port",
+        type=int,
+        default=0,
+        help="Serves live metrics on localhost at this port "
+             "(/metrics for Prometheus, /metrics.json for JSON)",
+    )
+    parser.add_argument(
+        "-memory-every",
+        type=non_negative_int,
+        default=0,
+        help="Prints a memory report every N games (send SIGUSR1 to "
+             "the process for one on demand)",
+    )
+    parser.add_argument(
+        "-memory-trace",
+        action="store_true",
+        help="Traces allocations with tracemalloc so memory reports "
+             "list the top allocating lines (slows training down)",
+    )
+    parser.add_argument(
+        "-early-stop",
+        action="store_true",
+        help="Stops training once the monitored score has not improved "
+             "for -patience checks",
+    )
+    parser.add_argument(
+        "-eval-every",
+        type=non_negative_int,
+        default=0,
+        help="Runs a greedy evaluation every N games and monitors its "
+             "score instead of the rolling training mean",
+    )
+    parser.add_argument(
+        "-eval-boards",
+        type=positive_int,
+        default=5,
+        help="Number of seeded boards played by each greedy evaluation",
+    )
+    parser.add_argument(
+        "-patience",
+        type=positive_int,
+        default=5,
+        help="Checks without improvement before the run has converged",
+    )
+    parser.add_argument(
+        "-min-delta",
+        type=float,
+        default=0.1,
+        help="Score gain that counts as an improvement",
+    )
+    parser.add_argument(
+        "-epsilon-decay",
+        type=str,
+        choices=["games", "steps", "time"],
+        default=None,
+        help="What the exploration rate decays with (defaults to time "
+             "when -time-budget limits the run without -sessions, "
+             "games otherwise)",
+    )
+    parser.add_argument(
+        "-epsilon-horizon",
+        type=positive_float,
+        default=None,
+        help="Games, steps or seconds until exploration stops (defaults "
+             "to -sessions for games and -time-budget for time)",
     )
     parser.add_argument(
         "-visual",
         type=str,
-        choices=["on", "off"],
+        choices=["on", "off", "async"],
         default='on',
-        help="Enables or disables the visualisation of the game",
+        help="Enables or disables the visualisation of the game "
+             "(async draws it in a separate process at full speed)",
+    )
+    parser.add_argument(
+        "-render-fps",
+        type=positive_int,
+        default=30,
+        help="Maximum frames per second drawn in async visual mode",
+    )
+    parser.add_argument(
+        "-render-every",
+        type=non_negative_int,
+        default=0,
+        help="In async visual mode, draw every Nth step instead of "
+             "limiting by frame rate",
     )
     parser.add_argument(
         "-save",
@@ -78,77 +240,512 @@ def parse_args():
         action="store_true",
         help="Enables step-by-step mode",
     )
+    parser.add_argument(
+        "-quiet",
+        action="store_true",
+        help="Does not print the snake's vision and moves, e.g. for "
+             "headless runs on large boards",
+    )
     parser.add_argument(
         "-board-size",
         type=board_size_type,
         default=10,
         help="Size of the board",
     )
+    parser.add_argument(
+        "-seed",
+        type=int,
+        default=None,
+        help="Seed of the board and the agent, for reproducible runs",
+    )
     parser.add_argument(
         "-speed",
         type=positive_int,
         default=100,
         help="Speed of the game",
     )
+    parser.add_argument(
+        "-pretrain",
+        type=str,
+        default=None,
+        help="Path to a dataset (.npz) to pretrain the model on",
+    )
+    parser.add_argument(
+        "-pretrain-epochs",
+        type=positive_int,
+        default=1,
+        help="Number of passes over the pretraining dataset",
+    )
+    parser.add_argument(
+        "-demos",
+        type=str,
+        nargs="+",
+        default=None,
+        help="Human demonstration files to preload into replay memory",
+    )
+    parser.add_argument(
+        "-record-episodes",
+        type=str,
+        default=None,
+        help="Path of an archive to record the played episodes to",
+    )
+    parser.add_argument(
+        "-keep-episodes",
+        type=non_negative_int,
+        default=0,
+        help="Only keep the N best and N worst recorded episodes "
+             "(0 keeps all of them)",
+    )
+    parser.add_argument(
+        "-observation",
+        type=str,
+        choices=["features", "grid"],
+        default="features",
+        help="State given to the agent: the 19 vision features or the "
+             "full board planes for a convolutional network",
+    )
+    parser.add_argument(
+        "-reachability",
+        action="store_true",
+        help="Adds the free area reachable after each action to the "
+             "feature vector",
+    )
+    parser.add_argument(
+        "-action-mask",
+        action="store_true",
+        help="Restricts exploration, greedy choices and the learning "
+             "target to actions that do not hit a wall or the body",
+    )
+    parser.add_argument(
+        "-target-score",
+        type=session_count,
+        default=None,
+        help="Reports the first game reaching this score",
+    )
+    parser.add_argument(
+        "-train-every",
+        type=non_negative_int,
+        default=0,
+        help="Replay gradient updates every N steps instead of training "
+             "on every step (0 keeps per-step training)",
+    )
+    parser.add_argument(
+        "-gradient-steps",
+        type=positive_int,
+        default=1,
+        help="Replay updates run every -train-every steps",
+    )
+    parser.add_argument(
+        "-batch-size",
+        type=session_count,
+        default=BATCH_SIZE,
+        help="Transitions sampled per replay update",
+    )
+    parser.add_argument(
+        "-n-step",
+        type=positive_int,
+        default=1,
+        help="Rewards summed per transition before bootstrapping",
+    )
+    parser.add_argument(
+        "-background-learner",
+        action="store_true",
+        help="Trains from replay on a separate thread while the game "
+             "keeps playing with periodically synced weights",
+    )
+    parser.add_argument(
+        "-sync-every",
+        type=session_count,
+        default=10,
+        help="Background learner updates between weight syncs",
+    )
+    parser.add_argument(
+        "-updates-per-step",
+        type=float,
+        default=0.0,
+        help="Caps the background learner at this many updates per "
+             "game step (0 lets it run freely)",
+    )
+    parser.add_argument(
+        "-compile",
+        action="store_true",
+        help="Compiles the training step with torch.compile and uses a "
+             "fused Adam (falls back to eager training if unavailable)",
+    )
+    parser.add_argument(
+        "-target-update",
+        type=non_negative_int,
+        default=0,
+        help="Bootstrap from a target network copied from the model "
+             "every N updates (0 disables it)",
+    )
+    parser.add_argument(
+        "-tau",
+        type=float,
+        default=0.0,
+        help="Soft-update the target network with this Polyak rate "
+             "after every update instead",
+    )
+    parser.add_argument(
+        "-double-dqn",
+        action="store_true",
+        help="Double DQN targets (needs -target-update or -tau)",
+    )
     parser.add_argument(
         "-game",
         action="store_true",
         help="Launch GUI configuration panel",
     )
-    return parser.parse_args()
+    args = parser.parse_args()
+    if not args.dontlearn and not args.game and \
+            not exploration_horizon(args, run_sessions(args)):
+        decay = exploration_decay(args)
+        limit = {"games": " or -sessions", "time": " or -time-budget"}
+        parser.error(f"exploration decaying with {decay} needs "
+                     f"-epsilon-horizon{limit.get(decay, '')}")
+    return args
+
+
+def best_model_path(path):
+    """
+    Where the best model seen by the convergence monitor is saved.
+    """
+    return path[:-len(".pth")] + "_best.pth"
+
+
+def run_sessions(args):
+    """
+    Returns the number of games to play, 10 when no other limit is
+    given, or None when the run is only limited by time or score.
+    """
+    if args.sessions is None and not getattr(args, "time_budget", None) \
+            and getattr(args, "target_mean", None) is None:
+        return 10
+    return args.sessions
+
+
+def exploration_decay(args):
+    """
+    Returns what epsilon decays with: the -epsilon-decay choice, or time
+    when a time budget limits the run without a session count.
+    """
+    decay = getattr(args, "epsilon_decay", None)
+    if decay:
+        return decay
+    if args.sessions is None and getattr(args, "time_budget", None):
+        return "time"
+    return "games"
+
+
+def exploration_horizon(args, sessions):
+    """
+    Returns the length of the epsilon schedule in games, steps or
+    seconds, or None when it cannot be derived from the arguments.
+    """
+    horizon = getattr(args, "epsilon_horizon", None)
+    if horizon:
+        return horizon
+    decay = exploration_decay(args)
+    if decay == "games":
+        return sessions
+    if decay == "time":
+        return getattr(args, "time_budget", None)
+    return None
+
+
+def pending_commands(commands):
+    """
+    Yields the (command, value) pairs waiting in a control queue.
+    """
+    while True:
+        try:
+            yield commands.get_nowait()
+        except queue.Empty:
+            return
 
 
 def run_game(args):
-    game = Snake(args.board_size, args.visual, args.step_by_step, args.speed)
-    agent = Agent()
-    plot_scores = []
-    plot_mean_scores = []
-    total_score = 0
-    record = 0
-    session = args.sessions
+    if getattr(args, "double_dqn", False) and not (
+            getattr(args, "target_update", 0) or getattr(args, "tau", 0.0)):
+        print("Double DQN needs a target network (-target-update or -tau).")
+        return
+    time_budget = getattr(args, "time_budget", None)
+    target_mean = getattr(args, "target_mean", None)
+    sessions = run_sessions(args)
+    decay = exploration_decay(args)
+    horizon = exploration_horizon(args, sessions)
+    if not horizon and not args.dontlearn:
+        print(f"Exploration decaying with {decay} needs -epsilon-horizon.")
+        return
+    seed = getattr(args, "seed", None)
+    game_seed, agent_seed, stats_seed = spawn_seeds(seed, 3)
+    game = Snake(args.board_size, args.visual, args.step_by_step, args.speed,
+                 verbose=not getattr(args, "quiet", False),
+                 render_fps=getattr(args, "render_fps", 30),
+                 render_every=getattr(args, "render_every", 0),
+                 reachability=getattr(args, "reachability", False),
+                 seed=int_seed(game_seed) if seed is not None else None)
+    observation = getattr(args, "observation", "features")
+    reachability = getattr(args, "reachability", False)
+    action_mask = getattr(args, "action_mask", False)
+    target_score = getattr(args, "target_score", None)
+    train_every = getattr(args, "train_every", 0)
+    n_step = getattr(args, "n_step", 1)
+    target_update = getattr(args, "target_update", 0)
+    tau = getattr(args, "tau", 0.0)
+    double_dqn = getattr(args, "double_dqn", False)
+    agent = Agent(observation, args.board_size, reachability, action_mask,
+                  train_every=train_every,
+                  gradient_steps=getattr(args, "gradient_steps", 1),
+                  batch_size=getattr(args, "batch_size", BATCH_SIZE),
+                  n_step=n_step, target_update=target_update, tau=tau,
+                  double_dqn=double_dqn,
+                  stats_every=getattr(args, "train_stats_every", 10),
+                  seed=agent_seed if seed is not None else None,
+                  compile_step=getattr(args, "compile", False))
+    observe = game.get_grid if observation == "grid" else game.get_state
+    stats = RunStats(getattr(args, "stats_window", 100),
+                     rng=random.Random(int_seed(stats_seed))
+                     if seed is not None else None)
+    early_stop = getattr(args, "early_stop", False)
+    eval_every = getattr(args, "eval_every", 0)
+    eval_seeds = range(getattr(args, "eval_boards", 5))
+    monitor = None
+    if (early_stop or eval_every) and not args.dontlearn:
+        monitor = ConvergenceMonitor(getattr(args, "patience", 5),
+                                     getattr(args, "min_delta", 0.1))
 
     if args.load:
         if os.path.exists(args.load):
             agent.model.load(args.load)
+            agent.trainer.sync_target()
             agent.epsilon = -1000
         else:
             print(f"Model file {args.load} not found.")
             return
+    if (observation == "grid" or reachability or n_step > 1) and (
+            getattr(args, "pretrain", None) or getattr(args, "demos", None)):
+        print("Pretraining data is only available for the 19 feature "
+              "observations with 1-step returns.")
+        return
+    if getattr(args, "pretrain", None):
+        if not os.path.exists(args.pretrain):
+            print(f"Dataset file {args.pretrain} not found.")
+            return
+        agent.pretrain(args.pretrain, args.pretrain_epochs)
+    if getattr(args, "demos", None):
+        missing = [path for path in args.demos if not os.path.exists(path)]
+        if missing:
+            print(f"Demonstration file {missing[0]} not found.")
+            return
+        loaded = agent.load_demonstrations(args.demos)
+        print(f"Loaded {loaded} demonstration transitions")
+        if not args.dontlearn:
+            agent.train_long_memory()
+    recorder = None
+    if getattr(args, "record_episodes", None):
+        archive = EpisodeArchive(args.record_episodes,
+                                 args.keep_episodes or None)
+        recorder = EpisodeRecorder(archive)
+        recorder.start(game)
+    learner = None
+    if getattr(args, "background_learner", False) and not args.dontlearn:
+        learner = BackgroundLearner(
+            agent, agent.batch_size, getattr(args, "sync_every", 10),
+            updates_per_step=getattr(args, "updates_per_step", 0.0)).start()
+
+    def save_model(path):
+        # Mid-run checkpoints; the final -save is written after the
+        # background learner has stopped.
+        if learner:
+            learner.save(path)
+        else:
+            agent.model.save(path)
+
+    metrics = None
+    if getattr(args, "metrics", None):
+        metrics = MetricsLog(args.metrics)
+    live = TrainingMetrics(agent, stats)
+    phases = live.phase_seconds
+    server = None
+    if getattr(args, "metrics_port", 0):
+        server = MetricsServer(live, args.metrics_port)
+        print(f"Serving metrics on http://127.0.0.1:{server.port}/metrics")
+    memory_every = getattr(args, "memory_every", 0)
+    reporter = MemoryReporter(agent, stats, learner,
+                              trace=getattr(args, "memory_trace", False))
+    reporter.install_signal()
+    # Set when the configuration panel runs the game in a worker process.
+    events = getattr(args, "events", None)
+    commands = getattr(args, "commands", None)
+    steps = 0
+    target_game = None
+    start_time = time.perf_counter()
+    game_start = start_time
+    game_reward = 0
+    train_seconds = 0.0
     try:
-        while session > 0:
-            state_old = game.get_state()
+        while True:
+            elapsed = time.perf_counter() - start_time
+            if sessions and agent.n_games >= sessions:
+                break
+            if time_budget and elapsed >= time_budget:
+                break
+            progress = {"games": agent.n_games, "steps": steps,
+                        "time": elapsed}[decay] / horizon if horizon else 1
+            act_start = time.perf_counter()
+            state_old = observe()
+            mask = game.action_mask() if action_mask else None
             final_move = agent.get_action(
-                state_old, args.sessions, args.dontlearn)
+                state_old, sessions, args.dontlearn, mask, progress)
+            env_start = time.perf_counter()
             reward, done, score = game.play_step(final_move)
-            state_new = game.get_state()
+            state_new = observe()
+            next_mask = game.action_mask() if action_mask else None
+            env_end = time.perf_counter()
+            phases["act"] += env_start - act_start
+            phases["env"] += env_end - env_start
+            steps += 1
+            live.steps = steps
+            game_reward += reward
+            if recorder:
+                recorder.step(game, final_move, done)
 
             if not args.dontlearn:
-                agent.train_short_memory(
-                    state_old, final_move, reward, state_new, done)
-                agent.remember(state_old, final_move, reward, state_new, done)
+                train_start = time.perf_counter()
+                agent.step(state_old, final_move, reward, state_new, done,
+                           next_mask)
+                train_time = time.perf_counter() - train_start
+                train_seconds += train_time
+                phases["train"] += train_time
+            if reporter.requested:
+                print(reporter.report())
             if done:
-                session -= 1
+                game_length = game.frame_iteration
                 game.reset()
                 agent.n_games += 1
+                if recorder:
+                    recorder.start(game)
 
-                if not args.dontlearn:
+                if not args.dontlearn and not train_every and not learner:
+                    train_start = time.perf_counter()
                     agent.train_long_memory()
+                    train_time = time.perf_counter() - train_start
+                    train_seconds += train_time
+                    phases["train"] += train_time
+                if metrics:
+                    now = time.perf_counter()
+                    train = agent.take_train_stats() or NO_TRAIN_STATS
+                    metrics.log(
+                        game=agent.n_games, score=score, length=game_length,
+                        reward=game_reward, epsilon=agent.epsilon,
+                        loss=train.loss, q_mean=train.q_mean,
+                        q_max=train.q_max, td_error=train.td_error,
+                        grad_norm=train.grad_norm,
+                        update_ms=1000 * train.seconds,
+                        seconds=now - game_start,
+                        train_seconds=train_seconds)
+                game_start = time.perf_counter()
+                game_reward = 0
+                train_seconds = 0.0
 
-                if score > record:
-                    record = score
+                stats.add(score)
+                if target_game is None and target_score and \
+                        score >= target_score:
+                    target_game = agent.n_games
 
                 if args.save:
-                    agent.model.save(args.save)
+                    save_model(args.save)
 
-                print('Game', agent.n_games, 'Score', score, 'Record:', record)
+                print('Game', agent.n_games, 'Score', score,
+                      'Record:', stats.record)
+                if events:
+                    elapsed = time.perf_counter() - start_time
+                    events.put({
+                        "games": agent.n_games,
+                        "record": stats.record,
+                        "mean": stats.rolling_mean,
+                        "steps_per_s": steps / max(elapsed, 1e-9),
+                    })
+                if commands:
+                    stop = False
+                    for command, value in pending_commands(commands):
+                        if command == "stop":
+                            stop = True
+                        elif command == "checkpoint":
+                            save_model(value)
+                            print(f"Checkpoint saved to {value}")
+                            if events:
+                                events.put({"checkpoint": value})
+                    if stop:
+                        print("Stopped from the configuration panel")
+                        break
 
                 if not args.dontlearn:
-                    plot_scores.append(score)
-                    total_score += score
-                    mean_score = total_score / agent.n_games
-                    plot_mean_scores.append(mean_score)
-                    plot(plot_scores, plot_mean_scores)
+                    plot(list(stats.recent), list(stats.recent_means))
+                if memory_every and agent.n_games % memory_every == 0:
+                    print(reporter.report())
+                value = None
+                if monitor and eval_every:
+                    if agent.n_games % eval_every == 0:
+                        value = evaluate_greedy(
+                            agent, args.board_size, eval_seeds, observation,
+                            reachability, action_mask)
+                        spread = 0.0
+                        print(f"Greedy evaluation: {value:.2f}")
+                elif monitor and agent.n_games % stats.window == 0:
+                    value = stats.rolling_mean
+                    spread = rolling_spread(stats)
+                if value is not None:
+                    status = monitor.check(value, spread)
+                    if status == IMPROVED and args.save:
+                        save_model(best_model_path(args.save))
+                    elif status == REGRESSED:
+                        print(f"Score regressed to {value:.2f} "
+                              f"(best {monitor.best:.2f})")
+                    elif status == CONVERGED and early_stop:
+                        print(f"No improvement over {monitor.best:.2f} in "
+                              f"{monitor.patience} checks, stopping")
+                        break
+                if target_mean is not None and \
+                        len(stats.recent) == stats.window and \
+                        stats.rolling_mean >= target_mean:
+                    print(f"Mean score {stats.rolling_mean:.2f} over the "
+                          f"last {stats.window} games reached")
+                    break
+        elapsed = time.perf_counter() - start_time
+        if learner:
+            # The published copy can be up to -sync-every updates behind:
+            # the final checkpoint takes the learner's own weights.
+            learner.stop()
+            if args.save:
+                agent.model.save(args.save)
+        print(stats.summary())
+        if events:
+            events.put({"summary": stats.summary()})
+        if learner:
+            print(f"Background learner: {learner.updates} updates, "
+                  f"{learner.publications} weight syncs")
+        print(f"{steps} steps in {elapsed:.1f}s "
+              f"({steps / max(elapsed, 1e-9):.0f} steps/s)")
+        if target_score:
+            if target_game is None:
+                print(f"Score {target_score} not reached in "
+                      f"{agent.n_games} games")
+            else:
+                print(f"Score {target_score} first reached in game "
+                      f"{target_game}")
     finally:
+        if learner:
+            learner.stop()
+        reporter.close()
+        if server:
+            server.close()
+        if metrics:
+            metrics.close()
+        if recorder:
+            recorder.archive.close()
+        game.close()
         pygame.quit()
         plt.close('all')
 
@@ -0,0 +1,294 @@
+import gc
+import signal
+import sys
+import time
+import tracemalloc
+import numpy as np
+import torch
+from matplotlib._pylab_helpers import Gcf
+
+# Transitions measured to estimate the size of a deque replay memory.
+REPLAY_SAMPLE = 64
+
+
+def format_bytes(size):
+    """
+    Human readable size, e.g. 1.5 MB.
+    """
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(size) < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else \
+                f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def rss_bytes():
+    """
+    Resident set size of the process, read from /proc on Linux. Falls
+    back to the peak RSS reported by getrusage elsewhere.
+
+    Returns:
+        tuple: Bytes and whether the value is the current RSS (False
+        when it is the peak), or (None, False) where neither is
+        available (Windows has no resource module)
+    """
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024, True
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None, False
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return peak if sys.platform == "darwin" else peak * 1024, False
+
+
+def object_bytes(obj):
+    """
+    Size of an object and of the arrays, numbers and tuples it holds.
+    """
+    if isinstance(obj, np.ndarray):
+        # getsizeof already counts the data of arrays owning it.
+        return sys.getsizeof(obj) + (obj.nbytes if obj.base is not None
+                                     else 0)
+    if isinstance(obj, (tuple, list)):
+        return sys.getsizeof(obj) + sum(object_bytes(item) for item in obj)
+    return sys.getsizeof(obj)
+
+
+def replay_bytes(memory, rng=None):
+    """
+    Approximate size of a replay memory.
+
+    The packed memory preallocates its arrays, so its size is exact.
+    A deque of transition tuples is estimated from a random sample of
+    REPLAY_SAMPLE transitions.
+
+    Returns:
+        tuple: Total bytes, bytes per transition and the projected
+        bytes once the memory is full
+    """
+    if hasattr(memory, "nbytes"):
+        per_transition = memory.nbytes / memory.capacity
+        return memory.nbytes, per_transition, memory.nbytes
+    container = sys.getsizeof(memory)
+    if not memory:
+        return container, 0.0, container
+    # Its own generator, so a report does not change the run.
+    rng = rng or np.random.default_rng(0)
+    idx = rng.choice(len(memory), min(REPLAY_SAMPLE, len(memory)),
+                     replace=False)
+    per_transition = float(np.mean([object_bytes(memory[i]) for i in idx]))
+    # Each slot of the deque is one pointer on top of the transition.
+    per_transition += 8
+    total = container + per_transition * len(memory)
+    capacity = memory.maxlen or len(memory)
+    return total, per_transition, container + per_transition * capacity
+
+
+def tensor_bytes(tensors):
+    return sum(t.numel() * t.element_size() for t in tensors
+               if isinstance(t, torch.Tensor))
+
+
+def network_bytes(agent, learner=None):
+    """
+    Bytes held by the networks: parameters and gradients of the model,
+    Adam state, the target network and the background learner copies.
+
+    Returns:
+        dict: Bytes per part, zero-sized parts left out
+    """
+    model = agent.model
+    trainer = agent.trainer
+    parts = {
+        "parameters": tensor_bytes(model.parameters()),
+        "gradients": tensor_bytes(p.grad for p in model.parameters()),
+        "adam state": sum(tensor_bytes(state.values())
+                          for state in trainer.optimizer.state.values()),
+    }
+    if trainer.target_model is not None:
+        parts["target network"] = tensor_bytes(
+            trainer.target_model.parameters())
+    if learner is not None:
+        parts["learner copies"] = sum(
+            tensor_bytes(buffer.parameters())
+            for buffer in learner.published_models())
+    if torch.cuda.is_available():
+        parts["cuda allocated"] = torch.cuda.memory_allocated()
+        parts["cuda reserved"] = torch.cuda.memory_reserved()
+    return {name: size for name, size in parts.items() if size}
+
+
+def stats_bytes(stats):
+    """
+    Bytes of the score windows and reservoir kept by RunStats.
+    """
+    return sum(object_bytes(list(values)) for values in
+               (stats.recent, stats.recent_means, stats.reservoir))
+
+
+def figure_state():
+    """
+    Open matplotlib figures, the artists drawn on them and the size of
+    their canvas buffers (4 bytes per pixel).
+
+    Returns:
+        tuple: Number of figures, number of artists and bytes
+    """
+    figures = artists = size = 0
+    # plt.figure(number) would also make each figure the current one.
+    for manager in Gcf.get_all_fig_managers():
+        figure = manager.canvas.figure
+        figures += 1
+        artists += len(figure.texts) + sum(
+            len(axes.get_children()) for axes in figure.axes)
+        width, height = figure.canvas.get_width_height()
+        size += 4 * width * height
+    return figures, artists, size
+
+
+class MemoryReporter:
+    def __init__(self, agent, stats, learner=None, trace=False, top=10):
+        """
+        Approximate memory accounting of a training run.
+
+        Args:
+            agent: Agent being trained
+            stats (RunStats): Score statistics of the run
+            learner (BackgroundLearner): Background learner, if any
+            trace (bool): Starts tracemalloc so the report lists the
+                lines allocating the most memory. Tracing slows
+                allocations down, so it is off by default.
+            top (int): Number of tracemalloc allocators reported
+
+        The report is built on demand, either every few games or after
+        request() was called, e.g. from the SIGUSR1 handler installed
+        by install_signal(). The training loop only checks the
+        requested flag, so a report never interrupts a step.
+        """
+        self.agent = agent
+        self.stats = stats
+        self.learner = learner
+        self.top = top
+        self.requested = False
+        self.start_time = time.perf_counter()
+        self._last_rss = None
+        self._previous_handler = None
+        self._tracing = trace and not tracemalloc.is_tracing()
+        if self._tracing:
+            tracemalloc.start()
+
+    def request(self, *_):
+        """
+        Asks for a report at the next check of the training loop. Takes
+        the signal handler arguments so it can be installed directly.
+        """
+        self.requested = True
+
+    def install_signal(self):
+        """
+        Reports on SIGUSR1 (kill -USR1 <pid>) where the platform has it
+        and this is the main thread.
+
+        Returns:
+            bool: Whether the handler was installed
+        """
+        if not hasattr(signal, "SIGUSR1"):
+            return False
+        try:
+            self._previous_handler = signal.signal(signal.SIGUSR1,
+                                                   self.request)
+        except ValueError:
+            return False
+        return True
+
+    def close(self):
+        if self._previous_handler is not None:
+            signal.signal(signal.SIGUSR1, self._previous_handler)
+            self._previous_handler = None
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+
+    def sections(self):
+        """
+        Returns:
+            list: (name, bytes, detail) tuples, one per subsystem
+        """
+        agent = self.agent
+        memory = agent.memory
+        total, per_transition, full = replay_bytes(memory)
+        capacity = getattr(memory, "capacity", None) or memory.maxlen
+        sections = [(
+            "replay memory", total,
+            f"{len(memory)} transitions, {format_bytes(per_transition)} "
+            f"each, {format_bytes(full)} at capacity {capacity}")]
+        networks = network_bytes(agent, self.learner)
+        sections.append((
+            "networks", sum(networks.values()),
+            ", ".join(f"{name} {format_bytes(size)}"
+                      for name, size in networks.items())))
+        stats = self.stats
+        sections.append((
+            "score stats", stats_bytes(stats),
+            f"{len(stats.recent)} recent, {len(stats.reservoir)} in "
+            f"reservoir"))
+        figures, artists, canvas = figure_state()
+        sections.append((
+            "matplotlib", canvas,
+            f"{figures} figure(s), {artists} artists (canvas buffers)"))
+        return sections
+
+    def report(self):
+        """
+        Builds the report and clears the requested flag.
+
+        Returns:
+            str: One line per subsystem, then the top tracemalloc
+            allocators when tracing
+        """
+        self.requested = False
+        # Garbage waiting for a collection would show up as growth.
+        gc.collect()
+        minutes = (time.perf_counter() - self.start_time) / 60
+        lines = [f"Memory report (game {self.agent.n_games}, "
+                 f"{minutes:.1f} min)"]
+        rss, current = rss_bytes()
+        label = "RSS" if current else "peak RSS"
+        if rss is None:
+            lines.append(f"  {label:<14} {'unavailable':>10}")
+        else:
+            growth = ""
+            if self._last_rss is not None:
+                growth = (f" ({format_bytes(rss - self._last_rss)} "
+                          f"since last)")
+            self._last_rss = rss
+            lines.append(f"  {label:<14} {format_bytes(rss):>10}{growth}")
+        for name, size, detail in self.sections():
+            lines.append(f"  {name:<14} {format_bytes(size):>10}  {detail}")
+        if tracemalloc.is_tracing():
+            lines.extend(self._allocators())
+        return "\n".join(lines)
+
+    def _allocators(self):
+        traced, peak = tracemalloc.get_traced_memory()
+        lines = [f"  {'tracemalloc':<14} {format_bytes(traced):>10}  "
+                 f"peak {format_bytes(peak)}"]
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen *>"),
+        ))
+        for stat in snapshot.statistics("lineno")[:self.top]:
+            frame = stat.traceback[0]
+            where = f"{frame.filename}:{frame.lineno}"
+            if len(where) > 48:
+                where = "..." + where[-45:]
+            lines.append(f"    {format_bytes(stat.size):>10} "
+                         f"{stat.count:>8} blocks  {where}")
+        return lines
@@ -0,0 +1,174 @@
+import argparse
+import json
+import os
+import queue
+import struct
+import threading
+import numpy as np
+
+MAGIC = b"L2SMETR1"
+
+_HEADER_SIZE = struct.Struct("<I")
+_CHUNK = struct.Struct("<I")
+
+# Columns written by main.run_game, one row per episode.
+EPISODE_COLUMNS = [
+    ("game", "<u4"),
+    ("score", "<i4"),
+    ("length", "<u4"),
+    ("reward", "<f4"),
+    ("epsilon", "<f4"),
+    ("loss", "<f4"),
+    ("q_mean", "<f4"),
+    ("q_max", "<f4"),
+    ("td_error", "<f4"),
+    ("grad_norm", "<f4"),
+    ("update_ms", "<f4"),
+    ("seconds", "<f4"),
+    ("train_seconds", "<f4"),
+]
+
+
+class MetricsLog:
+    def __init__(self, path, columns=EPISODE_COLUMNS, chunk_size=4096):
+        """
+        Append-only columnar log of training metrics.
+
+        Args:
+            path (str): Destination file
+            columns (list): (name, numpy dtype string) of each column
+            chunk_size (int): Rows buffered before a chunk is written
+
+        Rows go into a preallocated structured array. A full buffer is
+        handed to a background thread that writes it as one chunk, each
+        column stored contiguously, so logging a row is a few array
+        assignments and the training loop never waits on the disk. A
+        row of the default columns takes 52 bytes, about 52 MB per
+        million episodes.
+        """
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        self.path = path
+        self.dtype = np.dtype(columns)
+        self.chunk_size = chunk_size
+        self._buffer = np.zeros(chunk_size, dtype=self.dtype)
+        self._rows = 0
+        self.count = 0
+
+        self._file = open(path, "wb")
+        header = json.dumps(columns).encode()
+        self._file.write(MAGIC)
+        self._file.write(_HEADER_SIZE.pack(len(header)))
+        self._file.write(header)
+        self._file.flush()
+
+        self._chunks = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def log(self, **values):
+        """
+        Adds a row; columns that are not given are left at zero.
+        """
+        row = self._buffer[self._rows]
+        for name, value in values.items():
+            row[name] = value
+        self._rows += 1
+        self.count += 1
+        if self._rows == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Queues the buffered rows for writing.
+        """
+        if not self._rows:
+            return
+        self._chunks.put(self._buffer[:self._rows])
+        self._buffer = np.zeros(self.chunk_size, dtype=self.dtype)
+        self._rows = 0
+
+    def _write_loop(self):
+        while True:
+            rows = self._chunks.get()
+            if rows is None:
+                break
+            self._file.write(_CHUNK.pack(len(rows)))
+            for name in self.dtype.names:
+                self._file.write(np.ascontiguousarray(rows[name]).tobytes())
+            self._file.flush()
+
+    def close(self):
+        """
+        Writes the remaining rows and waits for the writer thread.
+        """
+        if self._file is None:
+            return
+        self.flush()
+        self._chunks.put(None)
+        self._writer.join()
+        self._file.close()
+        self._file = None
+
+
+def read_metrics(path):
+    """
+    Loads a metrics log.
+
+    Args:
+        path (str): File written by MetricsLog
+
+    Returns:
+        numpy.ndarray: Structured array with one field per column, e.g.
+        log["score"][log["epsilon"] == 0].mean(). A chunk cut short by
+        a crash is ignored.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a metrics log")
+        size, = _HEADER_SIZE.unpack(f.read(_HEADER_SIZE.size))
+        columns = [tuple(column) for column in json.loads(f.read(size))]
+        dtype = np.dtype(columns)
+        chunks = []
+        while True:
+            header = f.read(_CHUNK.size)
+            if len(header) < _CHUNK.size:
+                break
+            rows, = _CHUNK.unpack(header)
+            chunk = np.empty(rows, dtype=dtype)
+            try:
+                for name in dtype.names:
+                    field = dtype.fields[name][0]
+                    data = f.read(rows * field.itemsize)
+                    chunk[name] = np.frombuffer(data, dtype=field)
+            except ValueError:
+                break
+            chunks.append(chunk)
+    if not chunks:
+        return np.empty(0, dtype=dtype)
+    return np.concatenate(chunks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a metrics log")
+    parser.add_argument("path", type=str, help="File written with -metrics")
+    parser.add_argument("-last", type=int, default=None,
+                        help="Only summarize the last N rows")
+    args = parser.parse_args()
+
+    log = read_metrics(args.path)
+    if args.last:
+        log = log[-args.last:]
+    print(f"{len(log)} rows")
+    if not len(log):
+        return
+    for name in log.dtype.names:
+        column = log[name].astype(np.float64)
+        print(f"{name:>14}: min {np.nanmin(column):10.4g}  "
+              f"mean {np.nanmean(column):10.4g}  "
+              f"max {np.nanmax(column):10.4g}")
+
+
+if __name__ == "__main__":
+    main()
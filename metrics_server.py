@@ -0,0 +1,136 @@
+import json
+import threading
+import time
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+PHASES = ("act", "env", "train")
+
+
+class TrainingMetrics:
+    def __init__(self, agent, stats):
+        """
+        Live counters of a training run.
+
+        Args:
+            agent: Agent being trained
+            stats (RunStats): Score statistics of the run
+
+        The training loop only bumps plain attributes (steps and the
+        seconds spent choosing actions, stepping the game and training).
+        Everything else is read from the agent and the stats when a
+        snapshot is taken, so the loop takes no lock and does no extra
+        work for the endpoint.
+        """
+        self.agent = agent
+        self.stats = stats
+        self.steps = 0
+        self.phase_seconds = dict.fromkeys(PHASES, 0.0)
+        self.start_time = time.perf_counter()
+        self._last = (self.start_time, 0)
+
+    def snapshot(self):
+        now = time.perf_counter()
+        steps = self.steps
+        last_time, last_steps = self._last
+        self._last = (now, steps)
+        agent = self.agent
+        memory = agent.memory
+        capacity = getattr(memory, "capacity", None) or memory.maxlen
+        return {
+            "steps": steps,
+            "steps_per_second": steps / max(now - self.start_time, 1e-9),
+            "recent_steps_per_second":
+                (steps - last_steps) / max(now - last_time, 1e-9),
+            "games": self.stats.count,
+            "record": self.stats.record,
+            "rolling_mean_score": self.stats.rolling_mean,
+            "epsilon": agent.epsilon,
+            "replay_size": len(memory),
+            "replay_fill": len(memory) / capacity,
+            "last_loss": agent.last_loss,
+            "train": (agent.last_train_stats._asdict()
+                      if agent.last_train_stats else None),
+            "phase_seconds": dict(self.phase_seconds),
+        }
+
+
+def to_prometheus(snapshot):
+    """
+    Renders a snapshot in the Prometheus text exposition format.
+    """
+    lines = []
+
+    def metric(name, kind, value, labels=""):
+        if value is None:
+            return
+        lines.append(f"# TYPE l2s_{name} {kind}")
+        lines.append(f"l2s_{name}{labels} {value}")
+
+    metric("steps_total", "counter", snapshot["steps"])
+    metric("steps_per_second", "gauge", snapshot["steps_per_second"])
+    metric("recent_steps_per_second", "gauge",
+           snapshot["recent_steps_per_second"])
+    metric("games_total", "counter", snapshot["games"])
+    metric("record_score", "gauge", snapshot["record"])
+    metric("rolling_mean_score", "gauge", snapshot["rolling_mean_score"])
+    metric("epsilon", "gauge", snapshot["epsilon"])
+    metric("replay_size", "gauge", snapshot["replay_size"])
+    metric("replay_fill_ratio", "gauge", snapshot["replay_fill"])
+    metric("last_loss", "gauge", snapshot["last_loss"])
+    for name, value in (snapshot["train"] or {}).items():
+        metric(f"train_{name}", "gauge", value)
+    lines.append("# TYPE l2s_phase_seconds_total counter")
+    for phase, seconds in snapshot["phase_seconds"].items():
+        lines.append(f'l2s_phase_seconds_total{{phase="{phase}"}} {seconds}')
+    return "\n".join(lines) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/metrics":
+            body = to_prometheus(self.server.metrics.snapshot())
+            content_type = "text/plain; version=0.0.4"
+        elif path in ("/", "/metrics.json"):
+            body = json.dumps(self.server.metrics.snapshot())
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        data = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer:
+    def __init__(self, metrics, port, host="127.0.0.1"):
+        """
+        Serves TrainingMetrics over HTTP from a daemon thread.
+
+        Args:
+            metrics (TrainingMetrics): Counters to expose
+            port (int): Port to listen on (0 picks a free one)
+            host (str): Address to bind, localhost by default
+
+        /metrics answers in Prometheus text format and /metrics.json
+        (or /) in JSON. Requests are handled one at a time on the
+        server thread, which only competes with training while a
+        scrape is being answered.
+        """
+        self.httpd = HTTPServer((host, port), _Handler)
+        self.httpd.metrics = metrics
+        self.port = self.httpd.server_address[1]
+        self._thread = threading.Thread(target=self.httpd.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self._thread.join()
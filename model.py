@@ -3,10 +3,54 @@ import torch.nn as nn
 import torch.optim as optim
 import torch.nn.functional as F
 import os
+import copy
+import time
+import warnings
+from collections import namedtuple
 import numpy as np
 
+# Statistics of one QTrainer.train_step: loss, mean and max predicted
+# Q-value, mean absolute TD error of the taken actions, gradient norm
+# and the duration of the step in seconds.
+TrainStats = namedtuple(
+    'TrainStats', 'loss, q_mean, q_max, td_error, grad_norm, seconds')
 
-class QNet(nn.Module):
+
+class QNetBase(nn.Module):
+    # Number of dimensions of a single, unbatched observation.
+    input_dims = 1
+
+    def save(self, file_name):
+        """
+        Saves the trained model's state dictionary to a file.
+
+        Args:
+            file_name (str): Path where the model should be saved
+
+        Creates the directory if it doesn't exist and
+        saves all model parameters
+        (weights and biases) that can be later loaded to restore the model.
+        """
+        model_folder = os.path.dirname(file_name)
+        if model_folder:
+            if not os.path.exists(model_folder):
+                os.makedirs(model_folder)
+        torch.save(self.state_dict(), file_name)
+
+    def load(self, file_name):
+        """
+        Loads a previously saved model's state dictionary.
+
+        Args:
+            file_name (str): Path to the saved model file
+
+        Restores all model parameters (weights and biases) from the saved file,
+        allowing the model to continue from a previously trained state.
+        """
+        self.load_state_dict(torch.load(file_name))
+
+
+class QNet(QNetBase):
     def __init__(self, input_size, hidden_size, output_size):
         """
         Initializes the Q-Network architecture.
@@ -39,38 +83,67 @@ class QNet(nn.Module):
         x = self.fc2(x)
         return x
 
-    def save(self, file_name):
+
+class ConvQNet(QNetBase):
+    input_dims = 3
+
+    def __init__(self, channels, output_size, hidden_size=256):
         """
-        Saves the trained model's state dictionary to a file.
+        Initializes a small convolutional Q-Network for board grids.
 
         Args:
-            file_name (str): Path where the model should be saved
+            channels (int): Number of input planes (4 for Snake.get_grid)
+            output_size (int): Number of actions
+            hidden_size (int): Width of the fully connected layer
 
-        Creates the directory if it doesn't exist and
-        saves all model parameters
-        (weights and biases) that can be later loaded to restore the model.
+        Two 3x3 convolutions keep the board resolution, then an adaptive
+        pooling layer reduces any board size to 6x6 so the same network
+        works on every board size.
         """
-        model_folder = os.path.dirname(file_name)
-        if model_folder:
-            if not os.path.exists(model_folder):
-                os.makedirs(model_folder)
-        torch.save(self.state_dict(), file_name)
+        super().__init__()
+        self.conv1 = nn.Conv2d(channels, 16, kernel_size=3, padding=1)
+        self.conv2 = nn.Conv2d(16, 32, kernel_size=3, padding=1)
+        self.pool = nn.AdaptiveAvgPool2d(6)
+        self.fc1 = nn.Linear(32 * 6 * 6, hidden_size)
+        self.fc2 = nn.Linear(hidden_size, output_size)
 
-    def load(self, file_name):
+    def forward(self, x):
         """
-        Loads a previously saved model's state dictionary.
-
         Args:
-            file_name (str): Path to the saved model file
+            x: Tensor of shape (channels, h, w) or (batch, channels, h, w)
 
-        Restores all model parameters (weights and biases) from the saved file,
-        allowing the model to continue from a previously trained state.
+        Returns:
+            Q-values for each action, batched like the input
         """
-        self.load_state_dict(torch.load(file_name))
+        single = x.dim() == 3
+        if single:
+            x = x.unsqueeze(0)
+        x = F.relu(self.conv1(x))
+        x = F.relu(self.conv2(x))
+        x = torch.flatten(self.pool(x), 1)
+        x = F.relu(self.fc1(x))
+        x = self.fc2(x)
+        return x.squeeze(0) if single else x
+
+
+def make_adam(params, lr, fused=False):
+    """
+    Adam optimizer, with a single fused kernel per step when asked and
+    supported, else the multi-tensor foreach implementation.
+    """
+    params = list(params)
+    if fused:
+        try:
+            return optim.Adam(params, lr=lr, fused=True)
+        except (RuntimeError, TypeError, ValueError):
+            return optim.Adam(params, lr=lr, foreach=True)
+    return optim.Adam(params, lr=lr)
 
 
 class QTrainer:
-    def __init__(self, model, lr, gamma):
+    def __init__(self, model, lr, gamma, target_update=0, tau=0.0,
+                 double=False, stats_every=1, compile_step=False,
+                 compile_sizes=()):
         """
         Initializes the Q-learning trainer.
 
@@ -78,17 +151,112 @@ class QTrainer:
             model: The Q-network to be trained
             lr (float): Learning rate for the optimizer
             gamma (float): Discount factor for future rewards
+            target_update (int): If set, bootstrap from a frozen copy of
+                the model that is refreshed every target_update steps
+            tau (float): If set, bootstrap from a target network that
+                follows the model by Polyak averaging with this rate
+                after every step (takes precedence over target_update)
+            double (bool): Double DQN: the model picks the next action
+                and the target network evaluates it
+            stats_every (int): Compute TrainStats every this many steps
+                (0 never); they are returned by train_step and passed to
+                every callable in self.hooks
+            compile_step (bool): Run the forward pass, loss and backward pass
+                through torch.compile and step a fused Adam
+            compile_sizes (tuple): Batch sizes that use the compiled
+                step; other sizes run eagerly instead of recompiling
 
         Sets up the optimizer (Adam) and loss function (MSE) for training
         the Q-network using the Q-learning algorithm.
+
+        The compiled step is specialised to each batch size in
+        compile_sizes. It is built on the first step of each size, which
+        takes seconds. If torch.compile is missing or fails, the trainer
+        warns once and keeps training eagerly.
         """
         self.lr = lr
         self.gamma = gamma
         self.model = model
-        self.optimizer = optim.Adam(model.parameters(), lr=self.lr)
+        self.optimizer = make_adam(model.parameters(), self.lr,
+                                   fused=compile_step)
         self.criterion = nn.MSELoss()
+        self.target_update = target_update
+        self.tau = tau
+        self.double = double
+        self.stats_every = stats_every
+        self.hooks = []
+        self.updates = 0
+        self.target_model = None
+        if tau or target_update:
+            self.target_model = copy.deepcopy(model)
+            self.target_model.requires_grad_(False)
+        elif double:
+            raise ValueError("Double DQN needs a target network")
+        self.compile_sizes = set(compile_sizes)
+        self._compiled_loss = None
+        if compile_step:
+            if hasattr(torch, "compile"):
+                self._compiled_loss = torch.compile(self._loss,
+                                                    dynamic=False)
+            else:
+                warnings.warn("torch.compile is not available, training "
+                              "eagerly")
+
+    def sync_target(self):
+        """
+        Copies the model weights into the target network, e.g. after
+        loading a saved model.
+        """
+        if self.target_model is not None:
+            self.target_model.load_state_dict(self.model.state_dict())
+
+    def _update_target(self):
+        if self.tau:
+            with torch.no_grad():
+                for target, param in zip(self.target_model.parameters(),
+                                         self.model.parameters()):
+                    target.mul_(1 - self.tau).add_(param, alpha=self.tau)
+        elif self.updates % self.target_update == 0:
+            self.sync_target()
+
+    def _next_values(self, next_state, next_mask):
+        """
+        max Q(s', a') for a batch in one forward pass per network,
+        without building a graph.
+        """
+        with torch.no_grad():
+            target_model = self.target_model or self.model
+            q_next = target_model(next_state)
+            if self.double:
+                choice = self.model(next_state)
+            else:
+                choice = q_next
+            if next_mask is not None:
+                # Rows without any safe action are not masked.
+                allowed = next_mask | ~next_mask.any(1, keepdim=True)
+                choice = choice.masked_fill(~allowed, float("-inf"))
+            best = torch.argmax(choice, dim=1, keepdim=True)
+            return q_next.gather(1, best).squeeze(1)
+
+    def _loss(self, state, action, reward, next_state, done, next_mask):
+        """
+        Forward pass and Q-learning loss of a batch of tensors.
 
-    def train_step(self, state, action, reward, next_state, done):
+        Returns:
+            tuple: (loss, predicted Q-values, targets of the taken
+            actions, taken action indices)
+        """
+        pred = self.model(state)
+        q_new = reward + self.gamma * self._next_values(
+            next_state, next_mask) * ~done
+        rows = torch.arange(len(pred))
+        taken = torch.argmax(action, dim=1)
+        target = pred.detach().clone()
+        target[rows, taken] = q_new
+        return self.criterion(target, pred), pred, q_new, taken
+
+    def train_step(self, state, action, reward, next_state, done,
+                   next_mask=None):
         """
         Trains the Q-network using the Q-learning algorithm.
 
@@ -98,34 +266,73 @@ class QTrainer:
             reward: Reward received after taking the action
             next_state: State reached after taking the action
             done: Boolean indicating if the episode has ended
+            next_mask: Optional boolean [straight, right, left] mask (or
+                batch of masks) of the non-fatal actions in next_state;
+                the max only considers those when there is one
 
         The function implements the Bellman equation:
         Q(s,a) = reward + gamma * max(Q(s',a'))
-        where s' is the next state and a' are possible actions in s'
+        where s' is the next state and a' are possible actions in s'.
+        The whole batch is evaluated at once, and Q(s',a') comes from
+        the target network when there is one.
+
+        Returns:
+            TrainStats: Statistics of the step, or None on the steps
+            that are not sampled (see stats_every). They are gathered
+            from the tensors in a single transfer, and the gradient norm
+            is only computed on sampled steps.
         """
+        start = time.perf_counter()
         state = torch.tensor(np.array(state), dtype=torch.float)
         next_state = torch.tensor(np.array(next_state), dtype=torch.float)
         action = torch.tensor(np.array(action), dtype=torch.float)
         reward = torch.tensor(np.array(reward), dtype=torch.float)
-        done = torch.tensor(done, dtype=torch.bool)
+        done = torch.tensor(np.array(done), dtype=torch.bool)
+        if next_mask is not None:
+            next_mask = torch.tensor(np.array(next_mask), dtype=torch.bool)
 
-        if len(state.shape) == 1:
+        if state.dim() == self.model.input_dims:
             state = torch.unsqueeze(state, 0)
             next_state = torch.unsqueeze(next_state, 0)
             action = torch.unsqueeze(action, 0)
             reward = torch.unsqueeze(reward, 0)
-            done = (done, )
-
-        pred = self.model(state)
-
-        target = pred.clone()
-        for idx in range(len(done)):
-            Q_new = reward[idx]
-            if not done[idx]:
-                Q_new += self.gamma * torch.max(self.model(next_state[idx]))
-            target[idx][torch.argmax(action).item()] = Q_new
+            done = torch.unsqueeze(done, 0)
+            if next_mask is not None:
+                next_mask = torch.unsqueeze(next_mask, 0)
+        batch = (state, action, reward, next_state, done, next_mask)
 
         self.optimizer.zero_grad()
-        loss = self.criterion(target, pred)
+        if self._compiled_loss is not None and \
+                len(state) in self.compile_sizes:
+            try:
+                loss, pred, q_new, taken = self._compiled_loss(*batch)
+            except Exception as e:
+                warnings.warn(f"Compiled training step failed ({e}), "
+                              "training eagerly")
+                self._compiled_loss = None
+                self.optimizer.zero_grad()
+                loss, pred, q_new, taken = self._loss(*batch)
+        else:
+            loss, pred, q_new, taken = self._loss(*batch)
         loss.backward()
+        sample = self.stats_every and self.updates % self.stats_every == 0
+        if sample:
+            grad_norm = torch.linalg.vector_norm(torch.stack([
+                torch.linalg.vector_norm(p.grad)
+                for p in self.model.parameters() if p.grad is not None]))
         self.optimizer.step()
+        self.updates += 1
+        if self.target_model is not None:
+            self._update_target()
+        if not sample:
+            return None
+
+        q = pred.detach()
+        values = torch.stack([
+            loss.detach(), q.mean(), q.max(),
+            (q_new - q[torch.arange(len(q)), taken]).abs().mean(),
+            grad_norm]).tolist()
+        stats = TrainStats(*values, time.perf_counter() - start)
+        for hook in self.hooks:
+            hook(stats)
+        return stats
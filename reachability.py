@@ -0,0 +1,205 @@
+# Ring of the 8 cells around a cell, in order, as (dx, dy). Consecutive
+# entries are 4-adjacent, orthogonal neighbours are at even indices.
+_RING = ((0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1))
+
+# Changed cells above which the tracker rebuilds instead of updating,
+# which is what happens after a reset.
+_REBUILD_THRESHOLD = 4
+
+
+class ReachabilityTracker:
+    def __init__(self, core):
+        """
+        Keeps the connected regions of free cells of a SnakeCore.
+
+        Args:
+            core (SnakeCore): Board to follow
+
+        Each region is a bitboard. After a move only the cells that
+        changed are processed: a freed tail cell merges the regions
+        around it, and the new head is removed from its region, which is
+        only flood filled again when the cells around the head are not
+        connected locally, i.e. when the head may have cut the region in
+        two. Flood fills grow a bitboard with shifts, so even those
+        rare refills do not visit cells one by one in Python.
+        """
+        self.core = core
+        w = core.width
+        self._not_first = core.full ^ core.column_mask
+        self._not_last = core.full ^ (core.column_mask << (w - 1))
+        self._body = None
+        self.regions = []
+        self.rebuilds = 0
+        self.refills = 0
+
+    def _flood(self, seed, mask):
+        w = self.core.width
+        region = seed
+        while True:
+            grown = (region | ((region << 1) & self._not_first) |
+                     ((region >> 1) & self._not_last) |
+                     (region << w) | (region >> w)) & mask
+            if grown == region:
+                return region
+            region = grown
+
+    def _split(self, mask):
+        regions = []
+        while mask:
+            region = self._flood(mask & -mask, mask)
+            regions.append(region)
+            mask ^= region
+        return regions
+
+    def rebuild(self):
+        core = self.core
+        self._body = core.body
+        self.regions = self._split(core.full & ~core.body)
+        self.rebuilds += 1
+
+    def _neighbour_bits(self, cell):
+        core = self.core
+        x, y = core.xy(cell)
+        bits = 0
+        for direction in range(4):
+            other = core.next_cell(direction, cell)
+            if other is not None:
+                bits |= 1 << other
+        return bits, x, y
+
+    def _free(self, cell):
+        neighbours, _, _ = self._neighbour_bits(cell)
+        merged = 1 << cell
+        kept = []
+        for region in self.regions:
+            if region & neighbours:
+                merged |= region
+            else:
+                kept.append(region)
+        kept.append(merged)
+        self.regions = kept
+
+    def _locally_connected(self, x, y, region):
+        core = self.core
+        free = []
+        for dx, dy in _RING:
+            nx, ny = x + dx, y + dy
+            free.append(
+                0 <= nx < core.width and 0 <= ny < core.height and
+                (region >> (ny * core.width + nx)) & 1 == 1)
+        if all(free):
+            return True
+        # Count the runs of free ring cells that contain an orthogonal
+        # neighbour; a single run means the neighbours still touch.
+        start = free.index(False)
+        runs = 0
+        has_orthogonal = False
+        for step in range(1, 9):
+            i = (start + step) % 8
+            if free[i]:
+                has_orthogonal = has_orthogonal or i % 2 == 0
+            else:
+                runs += has_orthogonal
+                has_orthogonal = False
+        return runs <= 1
+
+    def _occupy(self, cell):
+        bit = 1 << cell
+        for i, region in enumerate(self.regions):
+            if region & bit:
+                break
+        else:
+            return
+        region ^= bit
+        del self.regions[i]
+        if not region:
+            return
+        neighbours, x, y = self._neighbour_bits(cell)
+        touching = region & neighbours
+        if touching & (touching - 1) and \
+                not self._locally_connected(x, y, region):
+            self.regions.extend(self._split(region))
+            self.refills += 1
+        else:
+            self.regions.append(region)
+
+    def sync(self):
+        """
+        Brings the regions up to date with the core.
+        """
+        body = self.core.body
+        if self._body is None:
+            self.rebuild()
+            return
+        if body == self._body:
+            return
+        added = body & ~self._body
+        freed = self._body & ~body
+        if (added.bit_count() + freed.bit_count()) > _REBUILD_THRESHOLD:
+            self.rebuild()
+            return
+        while freed:
+            low = freed & -freed
+            self._free(low.bit_length() - 1)
+            freed ^= low
+        while added:
+            low = added & -added
+            self._occupy(low.bit_length() - 1)
+            added ^= low
+        self._body = body
+
+    def area(self, cell):
+        """
+        Number of free cells reachable from a cell (0 if it is blocked).
+        """
+        if self.core.is_blocked(cell):
+            return 0
+        bit = 1 << cell
+        for region in self.regions:
+            if region & bit:
+                return region.bit_count()
+        return 0
+
+    def features(self):
+        """
+        Reachable area after going straight, right and left.
+
+        Returns:
+            list: For each relative action, the share of the free cells
+            that can still be reached from the cell it moves to
+        """
+        self.sync()
+        core = self.core
+        free = core.size - core.length
+        d = core.direction
+        return [
+            self.area(core.next_cell((d + turn) % 4)) / free if free else 0.0
+            for turn in (0, 1, -1)
+        ]
+
+
+def naive_areas(core):
+    """
+    Reference implementation with a plain BFS per action, used by the
+    benchmark to check the tracker.
+    """
+    d = core.direction
+    free = core.size - core.length
+    areas = []
+    for turn in (0, 1, -1):
+        start = core.next_cell((d + turn) % 4)
+        if core.is_blocked(start):
+            areas.append(0.0)
+            continue
+        seen = {start}
+        stack = [start]
+        while stack:
+            cell = stack.pop()
+            for direction in range(4):
+                other = core.next_cell(direction, cell)
+                if other is not None and other not in seen and \
+                        not core.is_blocked(other):
+                    seen.add(other)
+                    stack.append(other)
+        areas.append(len(seen) / free)
+    return areas
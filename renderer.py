@@ -0,0 +1,186 @@
+import pygame
+
+BLACK = (0, 0, 0)
+WHITE = (255, 255, 255)
+
+MAX_CACHED_TEXTS = 256
+
+
+def make_cell_sprite(block_size, color, inner_color=None, inner_rect=None):
+    """
+    Pre-renders one board cell.
+
+    Args:
+        block_size (int): Side of the cell in pixels
+        color: Fill color of the cell
+        inner_color: Optional color of an inner square
+        inner_rect: (x, y, w, h) of the inner square relative to the cell
+
+    Returns:
+        pygame.Surface: Sprite ready to be blitted on the board
+    """
+    sprite = pygame.Surface((block_size, block_size))
+    sprite.fill(color)
+    if inner_color is not None:
+        pygame.draw.rect(sprite, inner_color, pygame.Rect(*inner_rect))
+    return sprite
+
+
+class BoardRenderer:
+    def __init__(self, surface, block_size, sprites, font,
+                 text_pos=(0, 0), background=BLACK):
+        """
+        Draws the board incrementally with cached sprites.
+
+        Args:
+            surface: Target surface, usually the display surface
+            block_size (int): Side of a cell in pixels
+            sprites (dict): Sprite for each cell kind ('body', 'green',
+                'red', ...)
+            font: Font used for the score text
+            text_pos (tuple): Top-left corner of the score text
+            background: Color of empty cells
+
+        Cells are given in board coordinates and scaled by block_size
+        here. The renderer remembers what every cell showed in the last
+        frame.
+        Each draw only blits the cells whose content changed, which is
+        the new head, the vacated tail and the food that moved, plus the
+        cells under the score text when the score changes, and pushes
+        just those rectangles to the screen. draw() finds them by
+        diffing the whole board; update() is given them directly, so a
+        frame costs the same whatever the length of the snake.
+        """
+        self.surface = surface
+        self.block_size = block_size
+        self.sprites = dict(sprites)
+        self.sprites[None] = make_cell_sprite(block_size, background)
+        self.font = font
+        self.text_pos = text_pos
+        self.background = background
+        self._texts = {}
+        self._cells = {}
+        self._score = None
+        self._text_rect = None
+        self._full_redraw = True
+
+    def invalidate(self):
+        """
+        Forces the next draw to repaint the whole board, for instance
+        after something else has drawn over the surface.
+        """
+        self._full_redraw = True
+
+    @property
+    def needs_full_draw(self):
+        """
+        Whether the next frame has to go through draw() rather than
+        update(): nothing was drawn yet or the board was invalidated.
+        """
+        return self._full_redraw
+
+    def _text(self, score):
+        text = self._texts.get(score)
+        if text is None:
+            if len(self._texts) >= MAX_CACHED_TEXTS:
+                self._texts.clear()
+            text = self.font.render("Score: " + str(score), True, WHITE)
+            self._texts[score] = text
+        return text
+
+    def _cells_under(self, rect):
+        bs = self.block_size
+        for x in range(rect.left // bs, (rect.right - 1) // bs + 1):
+            for y in range(rect.top // bs, (rect.bottom - 1) // bs + 1):
+                yield (x, y)
+
+    def draw(self, body, foods, score, update_display=True):
+        """
+        Renders one frame.
+
+        Args:
+            body: Iterable of snake segment (x, y) cells
+            foods: Iterable of ((x, y), kind) pairs
+            score (int): Score shown in the corner
+            update_display (bool): Push the changed rectangles to the
+                screen with pygame.display.update
+
+        Returns:
+            list: Rectangles that changed in this frame
+        """
+        cells = {}
+        for pt in body:
+            cells[(pt[0], pt[1])] = "body"
+        for pt, kind in foods:
+            cells[(pt[0], pt[1])] = kind
+
+        if self._full_redraw:
+            self.surface.fill(self.background)
+            dirty = set(cells)
+        else:
+            old = self._cells
+            dirty = {pt for pt, kind in cells.items() if old.get(pt) != kind}
+            dirty.update(pt for pt in old if pt not in cells)
+        self._cells = cells
+        return self._blit(dirty, score, update_display)
+
+    def update(self, changes, score, update_display=True):
+        """
+        Renders one frame from the cells that changed since the last one.
+
+        Args:
+            changes: Iterable of ((x, y), kind) pairs, kind None for
+                cells that became empty
+            score (int): Score shown in the corner
+            update_display (bool): Push the changed rectangles to the
+                screen with pygame.display.update
+
+        Returns:
+            list: Rectangles that changed in this frame
+
+        Needs a board drawn by draw() first, see needs_full_draw.
+        """
+        cells = self._cells
+        dirty = set()
+        for pt, kind in changes:
+            pt = (pt[0], pt[1])
+            if cells.get(pt) != kind:
+                dirty.add(pt)
+                if kind is None:
+                    del cells[pt]
+                else:
+                    cells[pt] = kind
+        return self._blit(dirty, score, update_display)
+
+    def _blit(self, dirty, score, update_display):
+        bs = self.block_size
+        cells = self._cells
+        text = self._text(score)
+        text_rect = text.get_rect(topleft=self.text_pos)
+        redraw_text = self._full_redraw or score != self._score
+        if not redraw_text:
+            redraw_text = any(
+                text_rect.colliderect(pygame.Rect(x * bs, y * bs, bs, bs))
+                for x, y in dirty
+            )
+        if redraw_text:
+            dirty.update(self._cells_under(text_rect))
+            if self._text_rect is not None:
+                dirty.update(self._cells_under(self._text_rect))
+
+        rects = []
+        sprites = self.sprites
+        for x, y in dirty:
+            rects.append(self.surface.blit(sprites[cells.get((x, y))],
+                                           (x * bs, y * bs)))
+        if redraw_text:
+            rects.append(self.surface.blit(text, text_rect))
+
+        if self._full_redraw:
+            rects = [self.surface.get_rect()]
+        self._score = score
+        self._text_rect = text_rect
+        self._full_redraw = False
+        if update_display:
+            pygame.display.update(rects)
+        return rects
@@ -0,0 +1,154 @@
+import argparse
+import os
+import pygame
+from snakeAI import Snake, Direction, CLOCK_WISE, make_board_renderer
+from episodes import read_episodes
+
+
+class ReplaySnake(Snake):
+    def __init__(self, episode):
+        """
+        Headless Snake that replays a recorded episode.
+
+        Args:
+            episode: Episode returned by episodes.read_episodes
+
+        The recorded initial board replaces the random one and every
+        food placement is taken from the recording, so stepping it with
+        the recorded actions reproduces the original game.
+        """
+        self.episode = episode
+        self._spawn = None
+        super().__init__(episode.board_size, "off", False, 0, verbose=False)
+        self.core.placer = self._recorded_spawn
+
+    def _recorded_spawn(self, kind):
+        # No spawn is recorded when the board was full.
+        return self._spawn[0] if self._spawn is not None else None
+
+    def reset(self):
+        episode = self.episode
+        self.core.reset(
+            episode.body, CLOCK_WISE.index(Direction[episode.direction]))
+        for cell, kind in episode.foods:
+            self.core.add_food(cell, kind)
+        self.frame_iteration = 0
+
+    def frames(self):
+        """
+        Yields the game after the reset and after every recorded step.
+        """
+        yield self
+        for i, code in enumerate(self.episode.actions):
+            self._spawn = self.episode.spawns.get(i)
+            action = [0, 0, 0]
+            action[code] = 1
+            _, done, _ = self.play_step(action)
+            yield self
+            if done:
+                break
+
+
+def render_episode(episode, cell_size=16):
+    """
+    Renders a recorded episode offscreen.
+
+    Args:
+        episode: Episode to render
+        cell_size (int): Side of a cell in the output images
+
+    Yields:
+        pygame.Surface: One frame per step; the same surface is reused,
+        so copy it if frames have to be kept
+    """
+    game = ReplaySnake(episode)
+    size = episode.board_size * cell_size
+    surface = pygame.Surface((size, size))
+    renderer = make_board_renderer(surface, cell_size)
+    for state in game.frames():
+        renderer.draw(state.snake, state.foods, state.score,
+                      update_display=False)
+        yield surface
+
+
+def save_png_frames(episode, folder, cell_size=16):
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    count = 0
+    for count, surface in enumerate(render_episode(episode, cell_size)):
+        pygame.image.save(
+            surface, os.path.join(folder, f"frame_{count:05d}.png"))
+    return count + 1
+
+
+def save_gif(episode, path, cell_size=16, fps=10):
+    try:
+        from PIL import Image
+    except ImportError:
+        raise RuntimeError("Pillow is required to export GIF animations")
+
+    frames = []
+    for surface in render_episode(episode, cell_size):
+        frames.append(Image.frombytes(
+            "RGB", surface.get_size(),
+            pygame.image.tobytes(surface, "RGB")))
+    frames[0].save(path, save_all=True, append_images=frames[1:],
+                   duration=max(1, int(1000 / fps)), loop=0)
+    return len(frames)
+
+
+def select_episode(episodes, index=None, best=False, worst=False):
+    if best:
+        return max(episodes, key=lambda e: e.score)
+    if worst:
+        return min(episodes, key=lambda e: e.score)
+    return episodes[index or 0]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Replay recorded episodes")
+    parser.add_argument("archive", type=str,
+                        help="Episode archive written with -record-episodes")
+    parser.add_argument("-list", action="store_true",
+                        help="List the stored episodes")
+    parser.add_argument("-index", type=int, default=None,
+                        help="Episode to replay")
+    parser.add_argument("-best", action="store_true",
+                        help="Replay the highest scoring episode")
+    parser.add_argument("-worst", action="store_true",
+                        help="Replay the lowest scoring episode")
+    parser.add_argument("-png", type=str, default=None,
+                        help="Folder to write PNG frames to")
+    parser.add_argument("-gif", type=str, default=None,
+                        help="Path of an animated GIF to write")
+    parser.add_argument("-cell-size", type=int, default=16,
+                        help="Size of a cell in pixels")
+    parser.add_argument("-fps", type=int, default=10,
+                        help="Frames per second of the GIF")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    episodes = list(read_episodes(args.archive))
+    if not episodes:
+        print(f"No episodes in {args.archive}")
+        return
+    if args.list:
+        for i, episode in enumerate(episodes):
+            print(f"{i}: score {episode.score}, "
+                  f"{len(episode.actions)} steps, "
+                  f"board {episode.board_size}")
+        return
+
+    episode = select_episode(episodes, args.index, args.best, args.worst)
+    if args.png:
+        count = save_png_frames(episode, args.png, args.cell_size)
+        print(f"Wrote {count} frames to {args.png}")
+    if args.gif:
+        count = save_gif(episode, args.gif, args.cell_size, args.fps)
+        print(f"Wrote {count} frames to {args.gif}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import numpy as np
+
+
+class PackedReplayMemory:
+    def __init__(self, capacity, obs_shape, rng=None):
+        """
+        Fixed-size replay memory storing binary observations as bits.
+
+        Args:
+            capacity (int): Maximum number of transitions kept
+            obs_shape (tuple): Shape of one observation, e.g. (4, h, w)
+            rng: numpy Generator used to sample batches
+
+        Observations are 0/1 grids, so each one is stored with
+        np.packbits in preallocated arrays: a 42x42 grid with 4 planes
+        takes 882 bytes instead of 7056, and a whole transition (state,
+        next state, action, reward, done) about 1.8 KB. The oldest
+        transitions are overwritten once the memory is full, like the
+        deque used for feature vectors. The non-fatal actions of the
+        next state are kept alongside for action masking, so the target
+        does not have to decode them from the grid.
+        """
+        self.capacity = capacity
+        self.obs_shape = tuple(obs_shape)
+        self.rng = rng or np.random.default_rng()
+        self.obs_size = int(np.prod(self.obs_shape))
+        packed = (self.obs_size + 7) // 8
+        self.states = np.zeros((capacity, packed), dtype=np.uint8)
+        self.next_states = np.zeros((capacity, packed), dtype=np.uint8)
+        self.actions = np.zeros(capacity, dtype=np.uint8)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.dones = np.zeros(capacity, dtype=bool)
+        self.next_masks = np.ones((capacity, 3), dtype=bool)
+        self.index = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self):
+        return (self.states.nbytes + self.next_states.nbytes +
+                self.actions.nbytes + self.rewards.nbytes +
+                self.dones.nbytes + self.next_masks.nbytes)
+
+    def append(self, transition, next_mask=None):
+        state, action, reward, next_state, done = transition
+        i = self.index
+        self.states[i] = np.packbits(np.asarray(state, dtype=bool))
+        self.next_states[i] = np.packbits(
+            np.asarray(next_state, dtype=bool))
+        self.actions[i] = int(np.argmax(action))
+        self.rewards[i] = reward
+        self.dones[i] = done
+        self.next_masks[i] = True if next_mask is None else next_mask
+        self.index = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def _unpack(self, packed):
+        bits = np.unpackbits(packed, axis=1, count=self.obs_size)
+        return bits.reshape((len(packed),) + self.obs_shape)
+
+    def sample(self, batch_size):
+        """
+        Draws a random batch without replacement.
+
+        Returns:
+            tuple: (states, actions, rewards, next_states, dones,
+            next_masks) as arrays, with unpacked uint8 observations and
+            one-hot actions
+        """
+        if self.size > batch_size:
+            idx = self.rng.choice(self.size, batch_size, replace=False)
+        else:
+            idx = np.arange(self.size)
+        return (
+            self._unpack(self.states[idx]),
+            np.eye(3, dtype=np.uint8)[self.actions[idx]],
+            self.rewards[idx],
+            self._unpack(self.next_states[idx]),
+            self.dones[idx].tolist(),
+            self.next_masks[idx],
+        )
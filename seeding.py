@@ -0,0 +1,34 @@
+import numpy as np
+
+
+def seed_sequence(seed=None):
+    """
+    Wraps a seed in a numpy SeedSequence.
+
+    Args:
+        seed: int, SeedSequence, or None for fresh OS entropy
+
+    Returns:
+        numpy.random.SeedSequence: The sequence, spawn() it to get
+        independent child streams
+    """
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    return np.random.SeedSequence(seed)
+
+
+def spawn_seeds(seed, count):
+    """
+    Splits a seed into independent child seed sequences, one per
+    environment, agent or worker, so parallel streams never overlap
+    the way consecutive integer seeds can.
+    """
+    return seed_sequence(seed).spawn(count)
+
+
+def int_seed(seed):
+    """
+    32-bit integer drawn from a seed sequence, for generators that only
+    take integers (random.Random, torch.manual_seed).
+    """
+    return int(seed_sequence(seed).generate_state(1)[0])
@@ -3,6 +3,11 @@ import random
 from enum import Enum
 from collections import namedtuple
 import numpy as np
+import snake_core
+from snake_core import SnakeCore
+from reachability import ReachabilityTracker
+from renderer import BoardRenderer, make_cell_sprite
+from live_view import LiveView
 
 pygame.init()
 font = pygame.font.Font(None, 30)
@@ -15,8 +20,19 @@ class Direction(Enum):
     DOWN = 4
 
 
+# Board coordinates in cells; only the renderer scales them to pixels.
 Point = namedtuple('Point', 'x, y')
 
+# Immutable copy of everything that determines how a game continues.
+# Positions are cell indices (y * board_size + x), the body is packed
+# as a uint16 array, head first, boards holds the core bitboards and
+# lines their per-row and per-column ints.
+SnakeState = namedtuple(
+    'SnakeState',
+    'board_size, head, direction, body, foods, rng_state, '
+    'frame_iteration, score, boards, lines'
+)
+
 
 WHITE = (255, 255, 255)
 RED = (200, 0, 0)
@@ -27,116 +43,100 @@ GREEN = (0, 255, 0)
 
 
 class FoodType(Enum):
-    GREEN = 1
-    RED = 2
+    GREEN = snake_core.GREEN
+    RED = snake_core.RED
+
+
+CLOCK_WISE = [Direction.RIGHT, Direction.DOWN, Direction.LEFT, Direction.UP]
+
+# Renderer sprite keys of SnakeCore.kind_at results.
+CELL_SPRITES = {"body": "body", snake_core.GREEN: FoodType.GREEN,
+                snake_core.RED: FoodType.RED, None: None}
+
+
+WINDOW_SIZE = 800
+
+
+def board_pixels(board_size):
+    """
+    Returns the cell size and the window side in pixels for a board.
+    Boards wider than the window get one pixel per cell.
+    """
+    block_size = max(1, WINDOW_SIZE // board_size)
+    return block_size, block_size * board_size
+
+
+def make_board_renderer(surface, block_size):
+    inner_size = int(block_size * 0.6)
+    offset = (block_size - inner_size) // 2
+    sprites = {
+        "body": make_cell_sprite(
+            block_size, BLUE1, BLUE2,
+            (offset, offset, inner_size, inner_size)),
+        FoodType.GREEN: make_cell_sprite(block_size, GREEN),
+        FoodType.RED: make_cell_sprite(block_size, RED),
+    }
+    return BoardRenderer(surface, block_size, sprites, font)
 
 
 class Snake:
-    def __init__(self, board_size, visual, step_by_step, speed):
-        self.w = 800
+    def __init__(self, board_size, visual, step_by_step, speed,
+                 verbose=True, render_fps=30, render_every=0, seed=None,
+                 reachability=False):
+        self.rng = random.Random(seed)
         self.visual = visual == "on"
         self.step_by_step = step_by_step
+        self.verbose = verbose and (
+            visual == "off" or (self.visual and step_by_step))
         self.speed = speed
         self.num_cells = board_size
-        self.block_size = self.w // self.num_cells
-        self.w = self.block_size * self.num_cells
-        self.h = self.block_size * self.num_cells
+        self.block_size, self.w = board_pixels(board_size)
+        self.h = self.w
+        self.core = SnakeCore(board_size, board_size, self.rng)
+        self.reachability = (ReachabilityTracker(self.core)
+                             if reachability else None)
 
+        self.live_view = None
         if self.visual:
             self.display = pygame.display.set_mode((self.w, self.h))
             pygame.display.set_caption('Snake')
             self.clock = pygame.time.Clock()
+            self.renderer = make_board_renderer(self.display,
+                                                self.block_size)
+            self.core.track_changes()
+        elif visual == "async":
+            self.live_view = LiveView(board_size, render_fps, render_every)
 
         self.reset()
 
     def reset(self):
-        self.direction = Direction.RIGHT
-        min_x = 2 * self.block_size
-        self.head = Point(
-            random.randint(
-                min_x // self.block_size,
-                (self.w - self.block_size) // self.block_size
-            ) * self.block_size,
-            random.randint(
-                0,
-                (self.h - self.block_size) // self.block_size
-            ) * self.block_size
-        )
-        self.snake = [self.head,
-                      Point(self.head.x-self.block_size, self.head.y),
-                      Point(self.head.x-(2*self.block_size), self.head.y)]
-        self.score = 0
-        self.foods = []
-        self._place_foods()
+        x = self.rng.randint(2, self.num_cells - 1)
+        y = self.rng.randint(0, self.num_cells - 1)
+        cell = y * self.num_cells + x
+        self.core.reset([cell, cell - 1, cell - 2], snake_core.RIGHT)
+        self.core.fill_foods()
         self.frame_iteration = 0
 
-    def _place_foods(self):
-        green_count = sum(
-            1 for _,
-            food_type in self.foods if food_type == FoodType.GREEN
-        )
-        red_count = sum(
-            1 for _,
-            food_type in self.foods if food_type == FoodType.RED
-        )
+    @property
+    def direction(self):
+        return CLOCK_WISE[self.core.direction]
 
-        for _ in range(2 - green_count):
-            self._place_food(FoodType.GREEN)
-        if red_count < 1:
-            self._place_food(FoodType.RED)
-
-    def _place_food(self, food_type):
-        while True:
-            x = random.randint(
-                0,
-                (self.w - self.block_size) // self.block_size
-            ) * self.block_size
-            y = random.randint(
-                0,
-                (self.h - self.block_size) // self.block_size
-            ) * self.block_size
-            food_point = Point(x, y)
-
-            if food_point in self.snake or any(fp == food_point for fp,
-                                               _ in self.foods):
-                continue
-            else:
-                self.foods.append((food_point, food_type))
-                break
-
-    def _distance_to_visible_green(self, head):
-        head_x = head.x // self.block_size
-        head_y = head.y // self.block_size
-        min_distance = None
-
-        for dx, dy in [
-            (0, -1), (0, 1), (-1, 0), (1, 0)
-        ]:
-            x, y = head_x, head_y
-            distance = 0
-            while True:
-                x += dx
-                y += dy
-                distance += 1
-                if (
-                    x < 0 or x >= self.num_cells or
-                    y < 0 or y >= self.num_cells
-                ):
-                    break
-                if Point(
-                    x * self.block_size, y * self.block_size
-                ) in self.snake:
-                    break
-                for food_point, food_type in self.foods:
-                    if (
-                        food_type == FoodType.GREEN and
-                        food_point.x // self.block_size == x and
-                        food_point.y // self.block_size == y
-                    ):
-                        if min_distance is None or distance < min_distance:
-                            min_distance = distance
-                        break
-        return min_distance
+    @property
+    def head(self):
+        return self._point(self.core.head)
+
+    @property
+    def snake(self):
+        return [self._point(cell) for cell in self.core.body_cells()]
+
+    @property
+    def foods(self):
+        return [(self._point(cell), FoodType(kind))
+                for cell, kind in self.core.foods]
+
+    @property
+    def score(self):
+        return self.core.score
 
     def play_step(self, action):
         self.frame_iteration += 1
@@ -144,7 +144,9 @@ class Snake:
         if self.visual:
             self._update_ui()
             self.clock.tick(self.speed)
-        if not self.visual or (self.visual and self.step_by_step):
+        elif self.live_view and self.live_view.wants_frame():
+            self._submit_frame()
+        if self.verbose:
             self._get_snake_vision()
 
         for event in pygame.event.get():
@@ -152,48 +154,14 @@ class Snake:
                 pygame.quit()
                 quit()
 
-        old_distance = self._distance_to_visible_green(self.head)
-        self._move(action)
-        self.snake.insert(0, self.head)
-        new_distance = self._distance_to_visible_green(self.head)
-        reward = 0
-        game_over = False
+        move = action if isinstance(action, int) else \
+            int(np.argmax(action))
+        if self.verbose:
+            print(CLOCK_WISE[(self.core.direction + (0, 1, -1)[move]) % 4]
+                  .name)
+        reward, game_over = ai_step(self.core, move, self.frame_iteration)
 
-        if old_distance is not None and new_distance is not None:
-            if old_distance > new_distance:
-                reward += 1
-            else:
-                reward -= 1
-
-        if self.is_collision() or self.frame_iteration > 100*len(self.snake):
-            game_over = True
-            reward = -10
-            return reward, game_over, self.score
-
-        food_eaten = False
-        for i, (food_point, food_type) in enumerate(self.foods):
-            if self.head == food_point:
-                food_eaten = True
-                if food_type == FoodType.GREEN:
-                    self.score += 1
-                    reward = 10
-                elif food_type == FoodType.RED:
-                    if len(self.snake) == 0:
-                        game_over = True
-                        reward = -15
-                        return reward, game_over, self.score
-                    else:
-                        self.snake.pop()
-                        self.score -= 1
-                        reward = -5
-                self.foods.pop(i)
-                self._place_food(food_type)
-                break
-
-        if not food_eaten or food_type == FoodType.RED:
-            self.snake.pop()
-
-        if self.step_by_step:
+        if self.step_by_step and not game_over:
             pause = True
             if self.visual:
                 while pause:
@@ -207,91 +175,30 @@ class Snake:
                 input("Press Enter to continue...")
         return reward, game_over, self.score
 
-    def is_collision(self, pt=None):
-        if pt is None:
-            pt = self.head
-        if (
-            pt.x > self.w - self.block_size or pt.x < 0 or
-            pt.y > self.h - self.block_size or pt.y < 0
-        ):
-            return True
-        if pt in self.snake[1:]:
-            return True
-
-        return False
-
     def _update_ui(self):
-        self.display.fill(BLACK)
-
-        for pt in self.snake:
-            pygame.draw.rect(
-                self.display, BLUE1,
-                pygame.Rect(pt.x, pt.y, self.block_size, self.block_size)
-            )
-            inner_size = self.block_size * 0.6
-            offset = (self.block_size - inner_size) / 2
-            pygame.draw.rect(self.display,
-                             BLUE2,
-                             pygame.Rect(pt.x + offset, pt.y + offset,
-                                         inner_size, inner_size))
-
-        for food_point, food_type in self.foods:
-            color = GREEN if food_type == FoodType.GREEN else RED
-            pygame.draw.rect(
-                self.display,
-                color,
-                pygame.Rect(food_point.x, food_point.y,
-                            self.block_size, self.block_size)
-            )
-
-        text = font.render("Score: " + str(self.score), True, WHITE)
-        self.display.blit(text, [0, 0])
-        pygame.display.flip()
-
-    def _move(self, action):
-        clock_wise = [Direction.RIGHT, Direction.DOWN,
-                      Direction.LEFT, Direction.UP]
-        idx = clock_wise.index(self.direction)
-
-        if np.array_equal(action, [1, 0, 0]):
-            new_dir = clock_wise[idx]
-        elif np.array_equal(action, [0, 1, 0]):
-            next_idx = (idx + 1) % 4
-            new_dir = clock_wise[next_idx]
+        changed = self.core.take_changes()
+        if changed is None or self.renderer.needs_full_draw:
+            self.renderer.draw(self.snake, self.foods, self.score)
         else:
-            next_idx = (idx - 1) % 4
-            new_dir = clock_wise[next_idx]
+            core = self.core
+            self.renderer.update(
+                [(core.xy(cell), CELL_SPRITES[core.kind_at(cell)])
+                 for cell in changed], self.score)
 
-        if not self.visual or (self.visual and self.step_by_step):
-            print(new_dir.name)
+    def _submit_frame(self):
+        self.live_view.submit(self.core.body_cells(), self.core.foods,
+                              self.score)
 
-        self.direction = new_dir
-
-        x = self.head.x
-        y = self.head.y
-        if self.direction == Direction.RIGHT:
-            x += self.block_size
-        elif self.direction == Direction.LEFT:
-            x -= self.block_size
-        elif self.direction == Direction.DOWN:
-            y += self.block_size
-        elif self.direction == Direction.UP:
-            y -= self.block_size
-
-        self.head = Point(x, y)
+    def close(self):
+        if self.live_view:
+            self.live_view.close()
+            self.live_view = None
 
     def _get_snake_vision(self):
-        head_x, head_y = (
-            int(self.head.x // self.block_size),
-            int(self.head.y // self.block_size)
-        )
-
-        directions = {
-            "up": (0, -1),
-            "down": (0, 1),
-            "left": (-1, 0),
-            "right": (1, 0)
-        }
+        core = self.core
+        head_x, head_y = core.xy(core.head)
+        symbols = {"body": "S", snake_core.GREEN: "G",
+                   snake_core.RED: "R", None: "0"}
 
         vision = [
             [" " for _ in range(self.num_cells + 2)]
@@ -299,46 +206,63 @@ class Snake:
         ]
         vision[head_y + 1][head_x + 1] = "H"
 
-        for (dx, dy) in directions.values():
-            x, y = head_x, head_y
-            while True:
+        for dx, dy in snake_core.STEPS:
+            x, y = head_x + dx, head_y + dy
+            while 0 <= x < self.num_cells and 0 <= y < self.num_cells:
+                vision[y + 1][x + 1] = symbols[core.kind_at(
+                    y * self.num_cells + x)]
                 x += dx
                 y += dy
-
-                vis_x, vis_y = x + 1, y + 1
-                if (
-                    vis_x < 0 or vis_x >= len(vision[0]) or
-                    vis_y < 0 or vis_y >= len(vision)
-                ):
-                    break
-
-                if (
-                    x < 0 or x >= self.num_cells or
-                    y < 0 or y >= self.num_cells
-                ):
-                    vision[vis_y][vis_x] = "W"
-                    break
-                elif (
-                    Point(x * self.block_size, y * self.block_size) in
-                    self.snake
-                ):
-                    vision[vis_y][vis_x] = "S"
-                else:
-                    vision[vis_y][vis_x] = "0"
-
-                for food_point, food_type in self.foods:
-                    if (
-                        food_point.x // self.block_size == x and
-                        food_point.y // self.block_size == y
-                    ):
-                        vision[vis_y][vis_x] = (
-                            "G" if food_type == FoodType.GREEN else "R"
-                        )
+            vision[y + 1][x + 1] = "W"
 
         for row in vision:
             print(" ".join(row))
         print("\n")
 
+    def _point(self, cell):
+        return Point(*self.core.xy(cell))
+
+    def snapshot(self):
+        """
+        Captures the game as an immutable SnakeState.
+
+        Returns:
+            SnakeState: Head, direction, packed body, foods, RNG state,
+            frame counter, score and the core bitboards and lines,
+            without any display handle
+
+        The snapshot can be restored on this or any other Snake of the
+        same board size, or stepped without a Snake through simulate.
+        """
+        core = self.core.snapshot()
+        return SnakeState(
+            self.num_cells,
+            self.core.head,
+            self.direction,
+            core.body,
+            tuple((cell, FoodType(kind)) for cell, kind in core.foods),
+            self.rng.getstate(),
+            self.frame_iteration,
+            core.score,
+            core.boards,
+            core.lines,
+        )
+
+    def restore(self, state):
+        """
+        Puts the game back in the position captured by snapshot.
+
+        Args:
+            state (SnakeState): Snapshot of a game on the same board size
+        """
+        if state.board_size != self.num_cells:
+            raise ValueError(
+                f"Snapshot is for a {state.board_size} board, "
+                f"not {self.num_cells}")
+        self.core.load(_core_state(state))
+        self.rng.setstate(state.rng_state)
+        self.frame_iteration = state.frame_iteration
+
     def get_state(self):
         """
         Converts the current game state into
@@ -351,116 +275,139 @@ class Snake:
                 - Food direction relative to head (green apple) - 4 elements
                 - Food direction relative to head (green apple) - 4 elements
                 - Food direction relative to head (red apple) - 4 elements
+            With reachability enabled, 3 more elements follow: the share
+            of the free cells still reachable after going straight,
+            right and left, and the vector is float.
 
         The agent can only use information visible
         from the snake's head position.
         """
-        point_l = Point(self.head.x - self.block_size, self.head.y)
-        point_r = Point(self.head.x + self.block_size, self.head.y)
-        point_u = Point(self.head.x, self.head.y - self.block_size)
-        point_d = Point(self.head.x, self.head.y + self.block_size)
-
-        dir_l = self.direction == Direction.LEFT
-        dir_r = self.direction == Direction.RIGHT
-        dir_u = self.direction == Direction.UP
-        dir_d = self.direction == Direction.DOWN
-
-        def visible_green_food():
-            visible_greens = []
-            head_x = self.head.x // self.block_size
-            head_y = self.head.y // self.block_size
-
-            green_foods = [
-                food_point for food_point, food_type in self.foods
-                if food_type == FoodType.GREEN
-            ]
-
-            for food_point in green_foods:
-                food_x = food_point.x // self.block_size
-                food_y = food_point.y // self.block_size
-
-                if head_x == food_x or head_y == food_y:
-                    visible_greens.append(food_point)
-                    if len(visible_greens) == 2:
-                        break
-            return visible_greens
-
-        def visible_red_food():
-            head_x = self.head.x // self.block_size
-            head_y = self.head.y // self.block_size
-
-            red_food = [
-                food_point for food_point, food_type in self.foods
-                if food_type == FoodType.RED
-            ]
-
-            for food_point in red_food:
-                food_x = food_point.x // self.block_size
-                food_y = food_point.y // self.block_size
-
-                if head_x == food_x or head_y == food_y:
-                    return food_point
-            return None
-
-        green_apples = visible_green_food()
-        red_food = visible_red_food()
-        fallback = Point(self.head.x, self.head.y)
-
-        if len(green_apples) < 2:
-            green_apples += [fallback] * (2 - len(green_apples))
-
-        green_apple1, green_apple2 = green_apples
-        red_apple = red_food if red_food else fallback
-
-        state = [
-            (dir_r and self.is_collision(point_r)) or
-            (dir_l and self.is_collision(point_l)) or
-            (dir_u and self.is_collision(point_u)) or
-            (dir_d and self.is_collision(point_d)),
-
-            (dir_u and self.is_collision(point_r)) or
-            (dir_d and self.is_collision(point_l)) or
-            (dir_l and self.is_collision(point_u)) or
-            (dir_r and self.is_collision(point_d)),
-
-            (dir_d and self.is_collision(point_r)) or
-            (dir_u and self.is_collision(point_l)) or
-            (dir_r and self.is_collision(point_u)) or
-            (dir_l and self.is_collision(point_d)),
-
-            dir_l,
-            dir_r,
-            dir_u,
-            dir_d,
-
-            green_apple1.x < self.head.x,
-            green_apple1.x > self.head.x,
-            green_apple1.y < self.head.y,
-            green_apple1.y > self.head.y,
-
-            green_apple2.x < self.head.x,
-            green_apple2.x > self.head.x,
-            green_apple2.y < self.head.y,
-            green_apple2.y > self.head.y,
-
-            red_apple.x < self.head.x,
-            red_apple.x > self.head.x,
-            red_apple.y < self.head.y,
-            red_apple.y > self.head.y,
-        ]
-        state_array = np.array(state, dtype=int)
-        # state_label = [
-        #     "Danger Straight", "Danger Right", "Danger Left",
-        #     "Direction Left", "Direction Right", "Direction Up",
-        #     "Direction Down",
-        #     "Green Apple 1 Left", "Green Apple 1 Right",
-        #     "Green Apple 1 Up", "Green Apple 1 Down",
-        #     "Green Apple 2 Left", "Green Apple 2 Right",
-        #     "Green Apple 2 Up", "Green Apple 2 Down",
-        #     "Red Apple Left", "Red Apple Right",
-        #     "Red Apple Up", "Red Apple Down"
-        # ]
-        # print("State Vector:")
-        # for label, value in zip(state_label, state_array):
-        #     print(f"{label}: {value}")
-        return state_array
+        if self.reachability:
+            return np.array(
+                self.core.features() + self.reachability.features(),
+                dtype=np.float32)
+        return np.array(self.core.features(), dtype=int)
+
+    def action_mask(self):
+        """
+        Relative actions that are not immediately fatal.
+
+        Returns:
+            numpy.array: bool array [straight, right, left], the same
+            danger checks as the first three features of get_state
+        """
+        return np.array(self.core.safe_actions(), dtype=bool)
+
+    def get_grid(self):
+        """
+        Full-board observation for the convolutional network.
+
+        Returns:
+            numpy.array: uint8 array of shape (4, board_size, board_size)
+            with the body, head, green apple and red apple planes,
+            rotated so the snake moves up: straight, right and left are
+            the cells above, right of and left of the head
+        """
+        return self.core.grid(heading_up=True)
+
+
+def ai_step(core, move, frame_iteration):
+    """
+    Applies the training rules and rewards for one move.
+
+    Args:
+        core (SnakeCore): Board to play on
+        move (int): Relative action (0 straight, 1 right, 2 left)
+        frame_iteration (int): Steps played in the episode, this one
+            included
+
+    Returns:
+        tuple: (reward, game_over)
+
+    Moving closer to a visible green apple earns +1 and moving away -1,
+    eating a green apple +10, a red one -5, and dying -10 (-15 when a
+    red apple starves the snake, i.e. is eaten by a one-cell snake,
+    which used to go on with an empty body and -5), see
+    SnakeCore.advance_with_reward.
+    Episodes also end after 100 steps per body segment (-10).
+    """
+    direction = (core.direction + (0, 1, -1)[move]) % 4
+    if frame_iteration > 100 * (core.length + 1):
+        core.direction = direction
+        return -10, True
+    outcome, reward = core.advance_with_reward(direction)
+    return reward, outcome in (snake_core.DIED, snake_core.STARVED)
+
+
+def _core_state(state):
+    return snake_core.CoreState(
+        CLOCK_WISE.index(state.direction),
+        state.body,
+        state.boards,
+        tuple((cell, food_type.value) for cell, food_type in state.foods),
+        state.score,
+        state.lines,
+    )
+
+
+class _LazyRandom:
+    """
+    Stands in for random.Random during simulate and only rebuilds the
+    generator from its saved state when a food actually has to be placed.
+    """
+    def __init__(self, state):
+        self._state = state
+        self._rng = None
+
+    def randrange(self, *args):
+        if self._rng is None:
+            self._rng = random.Random()
+            self._rng.setstate(self._state)
+        return self._rng.randrange(*args)
+
+    def getstate(self):
+        return self._rng.getstate() if self._rng else self._state
+
+
+_scratch_cores = {}
+
+
+def simulate(state, action):
+    """
+    Plays one step from a snapshot without touching any Snake.
+
+    Args:
+        state (SnakeState): Snapshot to step from
+        action: One-hot action [straight, right, left] or its index
+
+    Returns:
+        tuple: (next_state, reward, done) with the same rewards and
+        food placements that Snake.play_step would produce from the
+        restored snapshot. After a fatal move the returned state only
+        advances the frame counter and direction.
+
+    The step runs on a shared scratch SnakeCore: loading a snapshot
+    reuses its bitboards and only copies the packed body and the row
+    and column lines, and the RNG is only rebuilt when a food is placed.
+    """
+    n = state.board_size
+    core = _scratch_cores.get(n)
+    if core is None:
+        core = _scratch_cores[n] = SnakeCore(n, n)
+    core.load(_core_state(state))
+    core.rng = _LazyRandom(state.rng_state)
+    move = action if isinstance(action, int) else list(action).index(1)
+    frame = state.frame_iteration + 1
+
+    reward, done = ai_step(core, move, frame)
+    direction = CLOCK_WISE[core.direction]
+    if done:
+        return (state._replace(direction=direction, frame_iteration=frame),
+                reward, True)
+    after = core.snapshot()
+    return (SnakeState(n, core.head, direction, after.body,
+                       tuple((cell, FoodType(kind))
+                             for cell, kind in after.foods),
+                       core.rng.getstate(), frame, after.score,
+                       after.boards, after.lines),
+            reward, False)
@@ -0,0 +1,555 @@
+import random
+from array import array
+from collections import namedtuple
+import numpy as np
+
+# Directions in clockwise order, so turning right is +1 and left is -1.
+RIGHT, DOWN, LEFT, UP = range(4)
+STEPS = ((1, 0), (0, 1), (-1, 0), (0, -1))
+
+# Food kinds, matching the values of snakeAI.FoodType.
+GREEN, RED = 1, 2
+
+# Outcomes of SnakeCore.advance.
+MOVED, ATE_GREEN, ATE_RED, DIED, STARVED = range(5)
+
+# Training rewards of the outcomes that override the distance reward.
+OUTCOME_REWARDS = {ATE_GREEN: 10, ATE_RED: -5, DIED: -10, STARVED: -15}
+
+# Immutable copy of a core. The body is packed head first as uint16
+# cells, boards holds the (body, green, red) bitboards and lines their
+# per-row and per-column ints as tuples.
+CoreState = namedtuple(
+    'CoreState', 'direction, body, boards, foods, score, lines')
+
+# Attempts at picking a random free cell before enumerating them.
+_PLACE_TRIES = 32
+
+# Cells are stored as uint16 (body ring, snapshots, episode files).
+MAX_CELLS = 1 << 16
+MIN_BOARD_SIZE = 7
+MAX_BOARD_SIZE = 256
+
+
+def _lsb(v):
+    return (v & -v).bit_length() - 1
+
+
+class SnakeCore:
+    def __init__(self, width, height, rng=None, min_length=1, greens=2,
+                 reds=1):
+        """
+        Headless snake rules on integer bitboards.
+
+        Args:
+            width (int): Number of columns
+            height (int): Number of rows
+            rng: random.Random used to place food
+            min_length (int): Eating a red apple that would leave the snake
+                shorter than this kills it
+            greens (int): Number of green apples on the board
+            reds (int): Number of red apples on the board
+
+        Cell y * width + x is bit y * width + x of the body, green and red
+        bitboards, so collision, food and line of sight checks are single
+        bit operations. The body order lives in a circular buffer of
+        cells: moving writes the new head and advances the tail index
+        instead of shifting a list.
+
+        Each board is also kept as one small int per row and per column
+        (bit x of row y, bit y of column x). Moves and the line of sight
+        checks only touch those, so a step costs about the same on a
+        256x256 board as on a 10x10 one, while the whole-board ints
+        serve snapshots, grids and flood fills.
+        """
+        if width * height > MAX_CELLS:
+            raise ValueError(
+                f"A {width}x{height} board has more than {MAX_CELLS} cells")
+        self.width = width
+        self.height = height
+        self.size = width * height
+        self.full = (1 << self.size) - 1
+        self.rng = rng or random.Random()
+        self.min_length = min_length
+        self.greens = greens
+        self.reds = reds
+        self.placer = None
+
+        # Bits of the first column of the whole-board ints.
+        self.column_mask = sum(1 << (y * width) for y in range(height))
+
+        self.ring = array('H', bytes(2 * self.size))
+        self.head_idx = 0
+        self.length = 0
+        self.body = 0
+        self.green = 0
+        self.red = 0
+        self.foods = []
+        self.direction = RIGHT
+        self.score = 0
+        # Cells touched since take_changes, None when not tracked.
+        self.changed = None
+        self._all_changed = False
+        self._clear_lines()
+
+    # Lines
+
+    def _clear_lines(self):
+        self.body_rows = [0] * self.height
+        self.body_cols = [0] * self.width
+        self.green_rows = [0] * self.height
+        self.green_cols = [0] * self.width
+        self.red_rows = [0] * self.height
+
+    def _rebuild_lines(self):
+        self._clear_lines()
+        w = self.width
+        for cell in self.body_cells():
+            self.body_rows[cell // w] |= 1 << (cell % w)
+            self.body_cols[cell % w] |= 1 << (cell // w)
+        for cell, kind in self.foods:
+            self._toggle_food_lines(cell, kind)
+
+    def _toggle_food_lines(self, cell, kind):
+        x, y = cell % self.width, cell // self.width
+        if kind == GREEN:
+            self.green_rows[y] ^= 1 << x
+            self.green_cols[x] ^= 1 << y
+        else:
+            self.red_rows[y] ^= 1 << x
+
+    # Changes
+
+    def track_changes(self):
+        """
+        Starts recording the cells each move touches (new head, vacated
+        tail, eaten and placed food), for renderers that only redraw
+        those. Untracked cores skip the bookkeeping.
+        """
+        self.changed = set()
+        self._all_changed = True
+
+    def take_changes(self):
+        """
+        Returns the cells touched since the last call, or None when the
+        whole board changed (first call, reset, load).
+        """
+        changed = None if self._all_changed else self.changed
+        self.changed = set()
+        self._all_changed = False
+        return changed
+
+    # Body
+
+    @property
+    def head(self):
+        return self.ring[self.head_idx]
+
+    @property
+    def tail(self):
+        return self.ring[(self.head_idx - self.length + 1) % self.size]
+
+    def body_cells(self):
+        """
+        Returns the body as an array of cells, head first.
+        """
+        start = self.head_idx - self.length + 1
+        if start >= 0:
+            cells = self.ring[start:self.head_idx + 1]
+        else:
+            cells = self.ring[start % self.size:]
+            cells.extend(self.ring[:self.head_idx + 1])
+        cells.reverse()
+        return cells
+
+    def reset(self, cells, direction=RIGHT):
+        """
+        Clears the board and lays out a new body.
+
+        Args:
+            cells: Body cells, head first
+            direction (int): Initial direction
+        """
+        cells = array('H', cells)
+        cells.reverse()
+        self.ring[:len(cells)] = cells
+        self.head_idx = len(cells) - 1
+        self.length = len(cells)
+        body = 0
+        for cell in cells:
+            body |= 1 << cell
+        self.body = body
+        self.green = 0
+        self.red = 0
+        self.foods = []
+        self.direction = direction
+        self.score = 0
+        self._all_changed = True
+        self._rebuild_lines()
+
+    def _push_head(self, cell):
+        self.head_idx = (self.head_idx + 1) % self.size
+        self.ring[self.head_idx] = cell
+        self.body |= 1 << cell
+        if self.changed is not None:
+            self.changed.add(cell)
+        y, x = divmod(cell, self.width)
+        self.body_rows[y] |= 1 << x
+        self.body_cols[x] |= 1 << y
+        self.length += 1
+
+    def _pop_tail(self):
+        cell = self.ring[(self.head_idx - self.length + 1) % self.size]
+        self.body ^= 1 << cell
+        if self.changed is not None:
+            self.changed.add(cell)
+        y, x = divmod(cell, self.width)
+        self.body_rows[y] ^= 1 << x
+        self.body_cols[x] ^= 1 << y
+        self.length -= 1
+        return cell
+
+    # Geometry
+
+    def xy(self, cell):
+        return cell % self.width, cell // self.width
+
+    def next_cell(self, direction, cell=None):
+        """
+        Returns the cell one step away in a direction, or None when the
+        step leaves the board.
+        """
+        if cell is None:
+            cell = self.head
+        dx, dy = STEPS[direction]
+        x = cell % self.width + dx
+        y = cell // self.width + dy
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return y * self.width + x
+        return None
+
+    def is_blocked(self, cell):
+        """
+        Tells whether moving to a cell (None for off the board) is fatal.
+        """
+        if cell is None:
+            return True
+        y, x = divmod(cell, self.width)
+        return (self.body_rows[y] >> x) & 1 == 1
+
+    def kind_at(self, cell):
+        bit = 1 << cell
+        if self.body & bit:
+            return "body"
+        if self.green & bit:
+            return GREEN
+        if self.red & bit:
+            return RED
+        return None
+
+    # Food
+
+    def add_food(self, cell, kind):
+        if kind == GREEN:
+            self.green |= 1 << cell
+        else:
+            self.red |= 1 << cell
+        self._toggle_food_lines(cell, kind)
+        self.foods.append((cell, kind))
+        if self.changed is not None:
+            self.changed.add(cell)
+
+    def _remove_food(self, cell, kind):
+        if kind == GREEN:
+            self.green ^= 1 << cell
+        else:
+            self.red ^= 1 << cell
+        self._toggle_food_lines(cell, kind)
+        if self.changed is not None:
+            self.changed.add(cell)
+        for i, (food_cell, _) in enumerate(self.foods):
+            if food_cell == cell:
+                del self.foods[i]
+                break
+
+    def place_food(self, kind):
+        """
+        Puts a food of the given kind on a random free cell.
+
+        Returns:
+            int: The chosen cell, or None when the board is full (or
+            when the placer, which replaces the random choice when set,
+            returns None)
+
+        A few random probes are tried first, which almost always succeed;
+        only crowded boards fall back to enumerating the free cells.
+        """
+        if self.placer is not None:
+            cell = self.placer(kind)
+            if cell is None:
+                return None
+        else:
+            occupied = self.body | self.green | self.red
+            cell = None
+            for _ in range(_PLACE_TRIES):
+                probe = self.rng.randrange(self.size)
+                if not (occupied >> probe) & 1:
+                    cell = probe
+                    break
+            if cell is None:
+                free = [c for c in range(self.size)
+                        if not (occupied >> c) & 1]
+                if not free:
+                    return None
+                cell = free[self.rng.randrange(len(free))]
+        self.add_food(cell, kind)
+        return cell
+
+    def fill_foods(self):
+        """
+        Tops the board up to the configured number of apples.
+        """
+        greens = sum(1 for _, kind in self.foods if kind == GREEN)
+        reds = len(self.foods) - greens
+        for _ in range(self.greens - greens):
+            self.place_food(GREEN)
+        for _ in range(self.reds - reds):
+            self.place_food(RED)
+
+    # Rules
+
+    def advance(self, direction):
+        """
+        Moves the snake one cell.
+
+        Args:
+            direction (int): Absolute direction of the move
+
+        Returns:
+            int: MOVED, ATE_GREEN, ATE_RED, DIED when hitting a wall or
+            the body (the board is left untouched) or STARVED when a red
+            apple would make the snake shorter than min_length
+        """
+        self.direction = direction
+        cell = self.next_cell(direction)
+        if self.is_blocked(cell):
+            return DIED
+        y, x = divmod(cell, self.width)
+        if (self.green_rows[y] >> x) & 1:
+            self._push_head(cell)
+            self._remove_food(cell, GREEN)
+            self.score += 1
+            self.place_food(GREEN)
+            return ATE_GREEN
+        if (self.red_rows[y] >> x) & 1:
+            if self.length - 1 < self.min_length:
+                return STARVED
+            self._push_head(cell)
+            self._remove_food(cell, RED)
+            self._pop_tail()
+            self._pop_tail()
+            self.score -= 1
+            self.place_food(RED)
+            return ATE_RED
+        self._push_head(cell)
+        self._pop_tail()
+        return MOVED
+
+    def advance_with_reward(self, direction):
+        """
+        Moves the snake one cell and scores the move with the training
+        rewards, so the agent and recorded human games share them.
+
+        Args:
+            direction (int): Absolute direction of the move
+
+        Returns:
+            tuple: (outcome, reward). Moving closer to a visible green
+            apple earns +1 and moving away -1, then OUTCOME_REWARDS
+            replaces that for eating, dying and starving.
+        """
+        cell = self.next_cell(direction)
+        reward = 0
+        if not self.is_blocked(cell):
+            old_distance = self.green_distance(self.head)
+            new_distance = self.green_distance(cell)
+            if old_distance is not None and new_distance is not None:
+                reward = 1 if old_distance > new_distance else -1
+        outcome = self.advance(direction)
+        return outcome, OUTCOME_REWARDS.get(outcome, reward)
+
+    # Vision
+
+    def _ray(self, cell, direction, rows, cols):
+        """
+        Distance to the first set bit of a board, given by its rows and
+        columns, along a ray starting next to `cell`, or None if there
+        is none.
+        """
+        y, x = divmod(cell, self.width)
+        if direction == RIGHT:
+            bits = rows[y] >> (x + 1)
+            return _lsb(bits) + 1 if bits else None
+        if direction == LEFT:
+            bits = rows[y] & ((1 << x) - 1)
+            return x - (bits.bit_length() - 1) if bits else None
+        if direction == DOWN:
+            bits = cols[x] >> (y + 1)
+            return _lsb(bits) + 1 if bits else None
+        bits = cols[x] & ((1 << y) - 1)
+        return y - (bits.bit_length() - 1) if bits else None
+
+    def green_distance(self, cell):
+        """
+        Distance to the nearest green apple visible from a cell.
+
+        Looks along the four lines through the cell and stops each one at
+        the first body segment, like the snake's own vision.
+
+        Returns:
+            int: Number of cells to the apple, or None if none is visible
+        """
+        best = None
+        for direction in (UP, DOWN, LEFT, RIGHT):
+            green = self._ray(cell, direction, self.green_rows,
+                              self.green_cols)
+            if green is None:
+                continue
+            body = self._ray(cell, direction, self.body_rows,
+                             self.body_cols)
+            if body is not None and body < green:
+                continue
+            if best is None or green < best:
+                best = green
+        return best
+
+    def features(self):
+        """
+        Encodes the board as the 19 features used by the agent.
+
+        Returns:
+            list: Danger straight/right/left, direction left/right/up/down,
+            then left/right/up/down flags for two visible green apples and
+            the visible red apple (all False when not visible)
+        """
+        head = self.head
+        d = self.direction
+        hy, hx = divmod(head, self.width)
+
+        greens = []
+        red = None
+        for cell, kind in self.foods:
+            y, x = divmod(cell, self.width)
+            if x != hx and y != hy:
+                continue
+            if kind == GREEN:
+                if len(greens) < 2:
+                    greens.append(cell)
+            elif red is None:
+                red = cell
+        greens += [head] * (2 - len(greens))
+        if red is None:
+            red = head
+
+        state = [
+            self.is_blocked(self.next_cell(d)),
+            self.is_blocked(self.next_cell((d + 1) % 4)),
+            self.is_blocked(self.next_cell((d - 1) % 4)),
+            d == LEFT,
+            d == RIGHT,
+            d == UP,
+            d == DOWN,
+        ]
+        for cell in greens + [red]:
+            x, y = cell % self.width, cell // self.width
+            state += [x < hx, x > hx, y < hy, y > hy]
+        return state
+
+    def safe_actions(self):
+        """
+        Tells which relative actions (straight, right, left) do not run
+        into a wall or the body, i.e. the negated danger features.
+        """
+        d = self.direction
+        return [not self.is_blocked(self.next_cell((d + turn) % 4))
+                for turn in (0, 1, -1)]
+
+    def _plane(self, board):
+        data = board.to_bytes((self.size + 7) // 8, "little")
+        bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8),
+                             bitorder="little")
+        return bits[:self.size].reshape(self.height, self.width)
+
+    def grid(self, heading_up=False):
+        """
+        Encodes the whole board as a uint8 array of shape (4, h, w).
+
+        Args:
+            heading_up (bool): Rotates the board so the snake moves up,
+                which puts going straight, right and left on fixed
+                sides of the head whatever the direction. Only for
+                square boards.
+
+        Returns:
+            numpy.array: Body, head, green apple and red apple planes
+
+        The planes are unpacked straight from the bitboards by NumPy, so
+        building the observation does not loop over cells in Python.
+        Without the rotation the planes do not tell the direction: on a
+        coiled body the neck can be any body cell next to the head.
+        """
+        grid = np.empty((4, self.height, self.width), dtype=np.uint8)
+        grid[0] = self._plane(self.body)
+        grid[1] = 0
+        x, y = self.xy(self.head)
+        grid[1, y, x] = 1
+        grid[2] = self._plane(self.green)
+        grid[3] = self._plane(self.red)
+        if heading_up:
+            if self.width != self.height:
+                raise ValueError("Only square boards can be rotated")
+            # Quarter turns counterclockwise bringing the direction up.
+            turns = (self.direction - UP) % 4
+            grid = np.ascontiguousarray(np.rot90(grid, turns, axes=(1, 2)))
+        return grid
+
+    # Snapshots
+
+    def snapshot(self):
+        return CoreState(
+            self.direction,
+            self.body_cells().tobytes(),
+            (self.body, self.green, self.red),
+            tuple(self.foods),
+            self.score,
+            self.lines(),
+        )
+
+    def lines(self):
+        """
+        Returns the per-row and per-column ints as a tuple of tuples, in
+        the order load expects them.
+        """
+        return (tuple(self.body_rows), tuple(self.body_cols),
+                tuple(self.green_rows), tuple(self.green_cols),
+                tuple(self.red_rows))
+
+    def load(self, state):
+        """
+        Restores a CoreState taken on a board of the same size. The
+        bitboards are shared immutable ints, so only the body order and
+        the row and column lines are copied, without walking the body.
+        """
+        cells = array('H')
+        cells.frombytes(state.body)
+        cells.reverse()
+        self.ring[:len(cells)] = cells
+        self.head_idx = len(cells) - 1
+        self.length = len(cells)
+        self.body, self.green, self.red = state.boards
+        self.foods = list(state.foods)
+        self.direction = state.direction
+        self.score = state.score
+        self._all_changed = True
+        (self.body_rows, self.body_cols, self.green_rows, self.green_cols,
+         self.red_rows) = map(list, state.lines)
@@ -1,10 +1,15 @@
 import pygame
-import random
 from enum import Enum
-from collections import namedtuple
+from collections import namedtuple, deque
+import argparse
 import json
 import os
 import time
+import numpy as np
+from demonstrations import DemoRecorder
+from renderer import BoardRenderer, make_cell_sprite
+import snake_core
+from snake_core import SnakeCore
 pygame.init()
 
 WHITE = (255, 255, 255)
@@ -22,6 +27,10 @@ big_font = pygame.font.Font(None, 50)
 
 SCORE_FILE = "score.json"
 BLOCK_SIZE = 20
+# Keyboard polls per second, independent of the snake's speed.
+INPUT_FPS = 120
+# Turns that can be queued ahead of the snake.
+INPUT_BUFFER = 3
 
 
 class Direction(Enum):
@@ -33,6 +42,19 @@ class Direction(Enum):
 
 Point = namedtuple("Point", 'x, y')
 
+CLOCK_WISE = [Direction.RIGHT, Direction.DOWN, Direction.LEFT, Direction.UP]
+
+# Renderer sprite keys of SnakeCore.kind_at results.
+CELL_SPRITES = {"body": "body", snake_core.GREEN: "green",
+                snake_core.RED: "red", None: None}
+
+KEY_DIRECTIONS = {
+    pygame.K_UP: Direction.UP,
+    pygame.K_DOWN: Direction.DOWN,
+    pygame.K_LEFT: Direction.LEFT,
+    pygame.K_RIGHT: Direction.RIGHT,
+}
+
 
 class Button:
     def __init__(self, text, x, y, width, height):
@@ -57,9 +79,10 @@ class Button:
 
 
 class SnakeGame:
-    def __init__(self, w=640, h=480):
+    def __init__(self, w=640, h=480, recorder=None):
         self.w = w
         self.h = h
+        self.recorder = recorder
         self.display = pygame.display.set_mode((self.w, self.h))
         pygame.display.set_caption("Snake Game")
         button_w, button_h = 200, 50
@@ -69,8 +92,22 @@ class SnakeGame:
                                    button_x, button_y,
                                    button_w, button_h)
         self.clock = pygame.time.Clock()
+        self.renderer = BoardRenderer(
+            self.display, BLOCK_SIZE,
+            {
+                "body": make_cell_sprite(BLOCK_SIZE, BLUE, BLUE_LIGHT,
+                                         (4, 4, 12, 12)),
+                "green": make_cell_sprite(BLOCK_SIZE, GREEN),
+                "red": make_cell_sprite(BLOCK_SIZE, RED),
+            },
+            font, text_pos=(5, 5))
+        self.core = SnakeCore(self.w // BLOCK_SIZE, self.h // BLOCK_SIZE,
+                              min_length=3)
+        self.core.track_changes()
         self.game_active = True
         self.scores = self.load_scores()
+        self.latencies = deque(maxlen=1000)
+        self.dropped_turns = 0
         self.reset()
 
     def load_scores(self):
@@ -102,47 +139,98 @@ class SnakeGame:
 
     def reset(self):
         self.direction = Direction.RIGHT
-        self.head = Point(
-            (self.w // 2) // BLOCK_SIZE * BLOCK_SIZE,
-            (self.h // 2) // BLOCK_SIZE * BLOCK_SIZE
-        )
-        self.snake = [self.head,
-                      Point(self.head.x-BLOCK_SIZE, self.head.y),
-                      Point(self.head.x-(2*BLOCK_SIZE), self.head.y)]
-        self.score = 0
-        self.green_apples = []
-        self.red_apple = None
-        self._place_green_apples(2)
-        self._place_red_apple()
+        cell = self.core.width * (self.core.height // 2) + \
+            self.core.width // 2
+        self.core.reset([cell, cell - 1, cell - 2], CLOCK_WISE.index(
+            self.direction))
+        self.core.fill_foods()
         self.speed = 5
         self.maxspeed = 42
         self.star_time = time.time()
+        self.turns = deque()
+        self.next_move = time.perf_counter() + 1 / self.speed
         self.game_active = True
-
-    def _place_green_apples(self, count):
-        for _ in range(count):
-            while True:
-                x = random.randint(0,
-                                   (self.w-BLOCK_SIZE)//BLOCK_SIZE
-                                   ) * BLOCK_SIZE
-                y = random.randint(0,
-                                   (self.h-BLOCK_SIZE)//BLOCK_SIZE
-                                   ) * BLOCK_SIZE
-                point = Point(x, y)
-                if point not in self.snake and point not in self.green_apples:
-                    self.green_apples.append(point)
-                    break
-
-    def _place_red_apple(self):
-        while True:
-            x = random.randint(0, (self.w-BLOCK_SIZE)//BLOCK_SIZE) * BLOCK_SIZE
-            y = random.randint(0, (self.h-BLOCK_SIZE)//BLOCK_SIZE) * BLOCK_SIZE
-            point = Point(x, y)
-            if point not in self.snake and point not in self.green_apples:
-                self.red_apple = point
-                break
+        self.renderer.invalidate()
+
+    def _point(self, cell):
+        return Point(*self.core.xy(cell))
+
+    @property
+    def score(self):
+        return self.core.score
+
+    @property
+    def head(self):
+        return self._point(self.core.head)
+
+    @property
+    def snake(self):
+        return [self._point(cell) for cell in self.core.body_cells()]
+
+    @property
+    def green_apples(self):
+        return [self._point(cell) for cell, kind in self.core.foods
+                if kind == snake_core.GREEN]
+
+    @property
+    def red_apple(self):
+        for cell, kind in self.core.foods:
+            if kind == snake_core.RED:
+                return self._point(cell)
+        return None
+
+    def queue_turn(self, direction, pressed):
+        """
+        Queues a turn for one of the next moves.
+
+        Args:
+            direction (Direction): Requested direction
+            pressed (float): time.perf_counter() when the key was read
+
+        Returns:
+            bool: Whether the turn was queued. Turns are checked against
+            the direction the snake will have when they are applied, so
+            repeating it or reversing onto the body is ignored, and
+            turns beyond INPUT_BUFFER are dropped.
+        """
+        pending = self.turns[-1][0] if self.turns else self.direction
+        index = CLOCK_WISE.index(pending)
+        if direction in (pending, CLOCK_WISE[(index + 2) % 4]):
+            return False
+        if len(self.turns) >= INPUT_BUFFER:
+            self.dropped_turns += 1
+            return False
+        self.turns.append((direction, pressed))
+        return True
+
+    def input_latency(self):
+        """
+        Returns:
+            dict: Number of applied turns, dropped turns and the median,
+            95th percentile and maximum time in milliseconds between a
+            key being read and the snake moving with it
+        """
+        result = {"turns": len(self.latencies),
+                  "dropped": self.dropped_turns}
+        if self.latencies:
+            p50, p95, worst = np.percentile(
+                np.array(self.latencies) * 1000, [50, 95, 100])
+            result.update(p50_ms=float(p50), p95_ms=float(p95),
+                          max_ms=float(worst))
+        return result
 
     def play_step(self):
+        """
+        Polls the input and moves the snake when its next move is due.
+
+        The keyboard is read INPUT_FPS times per second whatever the
+        speed, and each move applies at most one queued turn, so quick
+        key combinations are played one move after the other instead of
+        only the last one counting.
+
+        Returns:
+            tuple: (game over on this call, score)
+        """
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 pygame.quit()
@@ -154,68 +242,77 @@ class SnakeGame:
                     self.reset()
                     return False, self.score
 
-            if self.game_active and event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_UP:
-                    if self.direction != Direction.DOWN:
-                        self.direction = Direction.UP
-                elif event.key == pygame.K_DOWN:
-                    if self.direction != Direction.UP:
-                        self.direction = Direction.DOWN
-                elif event.key == pygame.K_LEFT:
-                    if self.direction != Direction.RIGHT:
-                        self.direction = Direction.LEFT
-                elif event.key == pygame.K_RIGHT:
-                    if self.direction != Direction.LEFT:
-                        self.direction = Direction.RIGHT
+            if self.game_active and event.type == pygame.KEYDOWN and \
+                    event.key in KEY_DIRECTIONS:
+                self.queue_turn(KEY_DIRECTIONS[event.key],
+                                time.perf_counter())
 
         if not self.game_active:
             self.show_gameover()
+            self.clock.tick(INPUT_FPS)
             return False, self.score
 
-        self._move(self.direction)
-        self.snake.insert(0, self.head)
+        now = time.perf_counter()
+        if now < self.next_move:
+            time.sleep(min(self.next_move - now, 1 / INPUT_FPS))
+            return False, self.score
+        # Keep a steady cadence, without catching up after a stall.
+        self.next_move = max(self.next_move + 1 / self.speed, now)
+
+        if self.recorder:
+            state_old = self.get_state()
+            direction_old = self.direction
+        if self.turns:
+            self.direction, pressed = self.turns.popleft()
+            self.latencies.append(now - pressed)
+
+        direction = CLOCK_WISE.index(self.direction)
+        if self.recorder:
+            outcome, reward = self.core.advance_with_reward(direction)
+        else:
+            outcome = self.core.advance(direction)
+        if outcome in (snake_core.ATE_GREEN, snake_core.ATE_RED):
+            self.speed = min(self.speed + 1, self.maxspeed)
 
-        if self._is_collision():
+        if outcome in (snake_core.DIED, snake_core.STARVED):
             self.game_active = False
             game_time = round(time.time() - self.star_time, 1)
             self.save_scores(self.score, game_time)
             self.current_time = game_time
+            latency = self.input_latency()
+            if latency["turns"]:
+                print(f"Input latency: median {latency['p50_ms']:.1f} ms, "
+                      f"p95 {latency['p95_ms']:.1f} ms over "
+                      f"{latency['turns']} turns, "
+                      f"{latency['dropped']} dropped")
+            if self.recorder:
+                self._record(state_old, direction_old, reward, True)
+                self.recorder.flush()
             return True, self.score
 
+        if self.recorder:
+            self._record(state_old, direction_old, reward, False)
+
         self._update_ui()
-        self.clock.tick(self.speed)
         return False, self.score
 
-    def _is_collision(self):
-        if (
-            self.head.x > self.w-BLOCK_SIZE or
-            self.head.x < 0 or
-            self.head.y > self.h-BLOCK_SIZE or
-            self.head.y < 0
-        ):
-            return True
-
-        if self.head in self.snake[1:]:
-            return True
-
-        if self.head in self.green_apples:
-            self.score += 1
-            self.green_apples.remove(self.head)
-            self._place_green_apples(1)
-            self.speed = min(self.speed + 1, self.maxspeed)
-            return False
-        elif self.head == self.red_apple:
-            if len(self.snake) == 4:
-                return True
-            self.snake.pop()
-            self.snake.pop()
-            self.score -= 1
-            self._place_red_apple()
-            self.speed = min(self.speed + 1, self.maxspeed)
-            return False
+    def _record(self, state_old, direction_old, reward, done):
+        turn = (CLOCK_WISE.index(self.direction) -
+                CLOCK_WISE.index(direction_old)) % 4
+        action = {0: 0, 1: 1, 3: 2}[turn]
+        self.recorder.record(state_old, action, reward,
+                             self.get_state(), done)
+
+    def get_state(self):
+        """
+        Encodes the game like snakeAI.Snake.get_state.
 
-        self.snake.pop()
-        return False
+        Returns:
+            numpy.array: The same 19 binary features the agent is trained
+            on (danger, direction, two visible green apples and the
+            visible red apple), so human play can be replayed to it.
+        """
+        return np.array(self.core.features(), dtype=int)
 
     def show_gameover(self):
         self.display.fill(BLACK)
@@ -253,63 +350,37 @@ class SnakeGame:
         pygame.display.flip()
 
     def _update_ui(self):
-        self.display.fill(BLACK)
-
-        for x in range(0, self.w, BLOCK_SIZE):
-            pygame.draw.line(self.display, BLACK, (x, 0), (x, self.h))
-
-        for y in range(0, self.h, BLOCK_SIZE):
-            pygame.draw.line(self.display, BLACK, (0, y), (self.w, y))
-
-        for point in self.snake:
-            pygame.draw.rect(
-                self.display,
-                BLUE, pygame.Rect(point.x, point.y, BLOCK_SIZE, BLOCK_SIZE)
-            )
-            pygame.draw.rect(
-                self.display,
-                BLUE_LIGHT, pygame.Rect(point.x+4, point.y+4, 12, 12)
-            )
-
-        for apple in self.green_apples:
-            pygame.draw.rect(
-                self.display,
-                GREEN,
-                pygame.Rect(apple.x, apple.y, BLOCK_SIZE, BLOCK_SIZE)
-            )
-
-        pygame.draw.rect(
-            self.display,
-            RED,
-            pygame.Rect(self.red_apple.x, self.red_apple.y,
-                        BLOCK_SIZE, BLOCK_SIZE)
-        )
-
-        font = pygame.font.Font(None, 30)
-        text = font.render("Score: " + str(self.score), True, WHITE)
-        self.display.blit(text, (5, 5))
-        pygame.display.flip()
-
-    def _move(self, direction):
-        x = self.head.x
-        y = self.head.y
-        if direction == Direction.RIGHT:
-            x += BLOCK_SIZE
-        elif direction == Direction.LEFT:
-            x -= BLOCK_SIZE
-        elif direction == Direction.UP:
-            y -= BLOCK_SIZE
-        elif direction == Direction.DOWN:
-            y += BLOCK_SIZE
-        self.head = Point(x, y)
-
-
-def main():
-    game = SnakeGame()
-
-    while True:
-        game.play_step()
+        changed = self.core.take_changes()
+        if changed is None or self.renderer.needs_full_draw:
+            self.renderer.draw(
+                self.snake,
+                [(self._point(cell), CELL_SPRITES[kind])
+                 for cell, kind in self.core.foods],
+                self.score)
+        else:
+            self.renderer.update(
+                [(self._point(cell), CELL_SPRITES[self.core.kind_at(cell)])
+                 for cell in changed], self.score)
+
+
+def main(record=None):
+    recorder = DemoRecorder(record) if record else None
+    game = SnakeGame(recorder=recorder)
+
+    try:
+        while True:
+            game.play_step()
+    finally:
+        if recorder:
+            recorder.close()
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Snake Game")
+    parser.add_argument(
+        "-record",
+        type=str,
+        default=None,
+        help="Path of a demonstration file to record the games to",
+    )
+    main(parser.parse_args().record)
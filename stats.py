@@ -0,0 +1,95 @@
+import math
+import random
+from collections import deque
+
+
+class RunStats:
+    def __init__(self, window=100, reservoir_size=1000, rng=None):
+        """
+        Streaming score statistics with a fixed memory footprint.
+
+        Args:
+            window (int): Number of recent games kept for the rolling
+                mean and the plot
+            reservoir_size (int): Number of scores kept as a uniform
+                sample of the whole run, for quantiles
+            rng: random.Random used by the reservoir
+
+        The overall mean and variance are updated with Welford's method
+        and the rolling mean with a running sum, so adding a game costs
+        O(1) and the memory used does not grow with the number of games.
+        """
+        self.window = window
+        self.reservoir_size = reservoir_size
+        self.rng = rng or random.Random()
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.record = None
+        self.recent = deque(maxlen=window)
+        self.recent_means = deque(maxlen=window)
+        self._recent_sum = 0
+        self._recent_sq = 0
+        self.reservoir = []
+
+    def add(self, score):
+        self.count += 1
+        delta = score - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (score - self.mean)
+        if self.record is None or score > self.record:
+            self.record = score
+
+        if len(self.recent) == self.window:
+            self._recent_sum -= self.recent[0]
+            self._recent_sq -= self.recent[0] ** 2
+        self.recent.append(score)
+        self._recent_sum += score
+        self._recent_sq += score ** 2
+        self.recent_means.append(self.mean)
+
+        if len(self.reservoir) < self.reservoir_size:
+            self.reservoir.append(score)
+        else:
+            i = self.rng.randrange(self.count)
+            if i < self.reservoir_size:
+                self.reservoir[i] = score
+
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    @property
+    def rolling_mean(self):
+        """
+        Mean of the last `window` scores (of all of them until then).
+        """
+        return self._recent_sum / len(self.recent) if self.recent else 0.0
+
+    @property
+    def rolling_std(self):
+        n = len(self.recent)
+        if n < 2:
+            return 0.0
+        mean = self._recent_sum / n
+        return math.sqrt(max(0.0, (self._recent_sq - n * mean * mean) /
+                             (n - 1)))
+
+    def quantile(self, q):
+        """
+        Estimates a score quantile (0 <= q <= 1) from the reservoir.
+        """
+        if not self.reservoir:
+            return None
+        ordered = sorted(self.reservoir)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self):
+        return (f"{self.count} games, mean {self.mean:.2f} "
+                f"(std {self.std:.2f}), last {len(self.recent)} "
+                f"{self.rolling_mean:.2f}, median {self.quantile(0.5)}, "
+                f"record {self.record}")